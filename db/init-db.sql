@@ -1,15 +1,4 @@
 CREATE EXTENSION IF NOT EXISTS vector;
 
-CREATE TABLE IF NOT EXISTS jobs (
-    id SERIAL PRIMARY KEY,
-    title TEXT NOT NULL,
-    company TEXT,
-    job_url TEXT UNIQUE,
-    description TEXT,
-    location TEXT,
-    is_remote BOOLEAN DEFAULT FALSE,
-    score INTEGER DEFAULT 0,
-    recommendations TEXT,
-    curated BOOLEAN DEFAULT FALSE,
-    curated_resume TEXT
-);
\ No newline at end of file
+-- Tables and indexes are created by the versioned migrations in server/fast/migrations,
+-- which the fast server applies on startup and records in schema_migrations.
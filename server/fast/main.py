@@ -1,12 +1,29 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, FileResponse
 from services.llm_service import LLMService
-from services.rag_service import setEmbeddings
-from services.orchestrator_agent import AgentService
-from services.utilities.database_util import get_curated_resume
+from services.rag_service import (
+    setEmbeddings,
+    cleanup_resume_versions,
+    validate_resume_id,
+    get_context_cache_stats,
+    get_embedding_cache_stats,
+    warm_up_converter,
+    DEFAULT_RESUME_ID,
+    DOC_SPLIT_MODE,
+    DOC_SPLIT_MODES,
+)
+from services.agent_registry import AgentRegistry
+from services.automate_queue import AutomateQueue
+from services.utilities.llm_gateway import llm_gateway
+from services.utilities.migrations import run_migrations, get_applied_migrations, check_query_plans
+from services.comparison_agent import get_scoring_stats
+from services.utilities.database_util import get_curated_resume, get_resume_versions, get_automate_run, list_automate_runs
 from pydantic import BaseModel
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 import json
@@ -23,7 +40,29 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 load_dotenv(dotenv_path=Path(__file__).with_name(".env"), override=True)
-app = FastAPI(title="AI Resume Agent", version="1.0.0")
+
+# PDF conversion and embedding run in this pool so uploads do not block the event loop
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "2"))
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start up and shut down shared resources.
+    """
+    if os.environ.get("RUN_MIGRATIONS", "true").lower() == "true":
+        # The schema must be current before any agent or queued run touches the database
+        await asyncio.to_thread(run_migrations)
+    if os.environ.get("DOCLING_WARMUP", "true").lower() == "true":
+        # Load the layout models in the background so startup is not delayed
+        asyncio.get_running_loop().run_in_executor(upload_executor, warm_up_converter)
+    await agent_registry.startup()
+    await automate_queue.start()
+    yield
+    await automate_queue.stop()
+    upload_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="AI Resume Agent", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -32,21 +71,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Run-Id", "X-Run-Status"],
 )
 
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 llm_service = LLMService()
-agent_service = AgentService()
+agent_registry = AgentRegistry()
+agent_service = agent_registry.agent_service
+automate_queue = AutomateQueue(agent_service)
 
 # Pydantic models for request/response
 class MessageRequest(BaseModel):
     text: str
+    resume_id: str = DEFAULT_RESUME_ID
 
 class MessageResponse(BaseModel):
     message: str
 
+def check_resume_id(resume_id: str):
+    """
+    Reject resume ids that cannot be used as part of a collection name.
+    """
+    try:
+        validate_resume_id(resume_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 def generate_stream(response_generator: Generator[str, None, None]) -> Generator[str, None, None]:
     """
     Generate a stream of responses from the AI.
@@ -69,9 +121,10 @@ async def send_message(request: MessageRequest):
     """
     Send a job description and get AI comparison with uploaded resume.
     """
+    check_resume_id(request.resume_id)
     try:
         text = request.text.replace('\r', '').replace('\n', '')
-        response_generator = llm_service.send_message(text)
+        response_generator = llm_service.send_message(text, request.resume_id)
         
         return StreamingResponse(
             generate_stream(response_generator),
@@ -88,12 +141,13 @@ async def send_message(request: MessageRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/revise_resume")
-async def revise_resume():
+async def revise_resume(resume_id: str = DEFAULT_RESUME_ID):
     """
     Generate a revised resume based on previous comparison.
     """
+    check_resume_id(resume_id)
     try:
-        response_generator = llm_service.revise_resume()
+        response_generator = llm_service.revise_resume(resume_id)
         
         return StreamingResponse(
             generate_stream(response_generator),
@@ -111,12 +165,21 @@ async def revise_resume():
 
 @app.get("/api/automate")
 async def automate(
+    response: Response,
     search_term: str = "software engineer",
     location: str = "",
     results_wanted: int = 10,
     hours_old: int = 24,
     country_indeed: str = "USA",
-    min_job_score: int = 60
+    min_job_score: int = 60,
+    force_rescore: bool = False,
+    resume_id: str = DEFAULT_RESUME_ID,
+    min_similarity: float = None,
+    similarity_top_k: int = None,
+    search_terms: list[str] = Query(default=None),
+    locations: list[str] = Query(default=None),
+    sites: list[str] = Query(default=None),
+    run_id: str = None
 ):
     """
     Begin the automated resume agent.
@@ -126,29 +189,146 @@ async def automate(
     - results_wanted
     - hours_old
     - country_indeed
+    - min_job_score
+    - force_rescore: rescore every job, even ones already scored against the current resume
+    - resume_id: resume to score and curate against
+    - min_similarity: only LLM-score jobs whose description embedding has at least this cosine similarity to the resume (0 disables)
+    - similarity_top_k: only LLM-score jobs among this many of the most similar jobs, already scored ones included (0 disables)
+    - search_terms, locations, sites: repeatable; every combination is scraped in parallel (sites defaults to indeed)
+    - run_id: resume a failed or interrupted run from its last completed step (other parameters are ignored)
+    The run id and final status are returned in the X-Run-Id and X-Run-Status headers.
     """
+    check_resume_id(resume_id)
     try:
-        result = await agent_service.automate(
+        result = await automate_queue.run(
             search_term=search_term,
             location=location,
             results_wanted=results_wanted,
             hours_old=hours_old,
             country_indeed=country_indeed,
-            min_job_score=min_job_score
+            min_job_score=min_job_score,
+            force_rescore=force_rescore,
+            resume_id=resume_id,
+            min_similarity=min_similarity,
+            similarity_top_k=similarity_top_k,
+            search_terms=search_terms,
+            locations=locations,
+            sites=sites,
+            run_id=run_id
         )
-        return result
+        response.headers["X-Run-Id"] = result["run_id"]
+        response.headers["X-Run-Status"] = result["status"]
+        return result["jobs"]
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Error in automate: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/automate/runs")
+async def enqueue_automate(
+    search_term: str = "software engineer",
+    location: str = "",
+    results_wanted: int = 10,
+    hours_old: int = 24,
+    country_indeed: str = "USA",
+    min_job_score: int = 60,
+    force_rescore: bool = False,
+    resume_id: str = DEFAULT_RESUME_ID,
+    min_similarity: float = None,
+    similarity_top_k: int = None,
+    search_terms: list[str] = Query(default=None),
+    locations: list[str] = Query(default=None),
+    sites: list[str] = Query(default=None)
+):
+    """
+    Queue an automated resume agent run and return immediately.
+    Accepts the same query parameters as /api/automate; poll /api/automate/runs/{run_id} for status and progress.
+    """
+    check_resume_id(resume_id)
+    try:
+        run_id = await automate_queue.enqueue(
+            search_term=search_term,
+            location=location,
+            results_wanted=results_wanted,
+            hours_old=hours_old,
+            country_indeed=country_indeed,
+            min_job_score=min_job_score,
+            force_rescore=force_rescore,
+            resume_id=resume_id,
+            min_similarity=min_similarity,
+            similarity_top_k=similarity_top_k,
+            search_terms=search_terms,
+            locations=locations,
+            sites=sites
+        )
+        return {"run_id": run_id, "status": "queued"}
+    except Exception as e:
+        logger.error(f"Error in enqueue_automate: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/automate/runs")
+async def automate_runs(status: str = None, limit: int = 50):
+    """
+    List automate runs, newest first, optionally filtered by status
+    (queued, running, completed, completed_with_errors, failed or cancelled).
+    """
+    try:
+        return await asyncio.to_thread(list_automate_runs, status, limit)
+    except Exception as e:
+        logger.error(f"Error in automate_runs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/automate/runs/{run_id}")
+async def automate_run(run_id: str):
+    """
+    Return the status, last completed step and progress of an automate run.
+    """
+    try:
+        run = await asyncio.to_thread(get_automate_run, run_id)
+    except Exception as e:
+        logger.error(f"Error in automate_run: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if run is None:
+        raise HTTPException(status_code=404, detail="Automate run not found")
+    return run
+
+@app.post("/api/automate/runs/{run_id}/cancel")
+async def cancel_automate_run(run_id: str):
+    """
+    Cancel a queued or running automate run.
+    Runs executing in another server process cannot be cancelled from this one.
+    """
+    try:
+        run = await automate_queue.cancel(run_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in cancel_automate_run: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if run is None:
+        raise HTTPException(status_code=404, detail="Automate run not found")
+    return run
+
 @app.post("/api/upload")
-async def upload(file: UploadFile = File(...)):
+async def upload(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    split_mode: str = DOC_SPLIT_MODE,
+    resume_id: str = DEFAULT_RESUME_ID
+):
     """
     Upload a resume PDF file for processing.
+    split_mode selects how the resume is chunked: "markdown" (local, default) or "llm".
+    resume_id selects which candidate's resume the upload becomes the new version of.
     """
+    check_resume_id(resume_id)
     try:
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file selected")
+
+        if split_mode not in DOC_SPLIT_MODES:
+            raise HTTPException(status_code=400, detail=f"split_mode must be one of {', '.join(DOC_SPLIT_MODES)}")
         
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
@@ -166,9 +346,11 @@ async def upload(file: UploadFile = File(...)):
                 self.filename = filename
         
         file_wrapper = FileWrapper(file.filename)
-        setEmbeddings(file_wrapper)
+        version = await asyncio.get_running_loop().run_in_executor(upload_executor, setEmbeddings, file_wrapper, split_mode, resume_id)
+        # Superseded versions are removed after the response is sent
+        background_tasks.add_task(cleanup_resume_versions, resume_id)
         
-        return MessageResponse(message=f"{file.filename} uploaded successfully!")
+        return MessageResponse(message=f"{file.filename} uploaded successfully as {resume_id} version {version}!")
     
     except HTTPException:
         raise
@@ -177,14 +359,15 @@ async def upload(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/download_curated_resume")
-async def download_curated_resume(job_url: str, asPdf: bool = False):
+async def download_curated_resume(job_url: str, asPdf: bool = False, resume_id: str = DEFAULT_RESUME_ID):
     """
-    Retrieve the curated resume for a specific job.
+    Retrieve the resume curated from resume_id for a specific job.
     If asPdf is True, return the resume as a PDF file.
     Otherwise, return the markdown content.
     """
+    check_resume_id(resume_id)
     try:
-        title, curated_resume = get_curated_resume(job_url)
+        title, curated_resume = get_curated_resume(job_url, resume_id) or (None, None)
         if not curated_resume:
             raise HTTPException(status_code=404, detail="Curated resume not found for the given job_url")
         
@@ -214,6 +397,43 @@ async def download_curated_resume(job_url: str, asPdf: bool = False):
         logger.error(f"Error in get_curated_resume: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/resumes")
+async def resumes(resume_id: str = None):
+    """
+    List uploaded resume versions, optionally for a single resume_id.
+    """
+    try:
+        return await asyncio.to_thread(get_resume_versions, resume_id)
+    except Exception as e:
+        logger.error(f"Error in resumes: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/metrics")
+async def metrics():
+    """
+    Return in-process cache, LLM gateway and scoring statistics.
+    """
+    return {
+        "context_cache": get_context_cache_stats(),
+        "embedding_cache": get_embedding_cache_stats(),
+        "llm": llm_gateway.get_stats(),
+        "scoring": get_scoring_stats()
+    }
+
+@app.get("/api/schema")
+async def schema(check_plans: bool = False):
+    """
+    Return the applied schema migrations and, with check_plans, whether the hot jobs queries use their indexes.
+    """
+    try:
+        result = {"migrations": await asyncio.to_thread(get_applied_migrations)}
+        if check_plans:
+            result["query_plans"] = await asyncio.to_thread(check_query_plans)
+        return result
+    except Exception as e:
+        logger.error(f"Error in schema: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/")
 async def root():
     """
@@ -226,7 +446,11 @@ async def root():
             "upload": "/api/upload",
             "send_message": "/api/send_message", 
             "revise_resume": "/api/revise_resume",
-            "get_curated_resume": "/api/get_curated_resume"
+            "get_curated_resume": "/api/get_curated_resume",
+            "resumes": "/api/resumes",
+            "automate_runs": "/api/automate/runs",
+            "metrics": "/api/metrics",
+            "schema": "/api/schema"
         }
     }
 
@@ -0,0 +1,3 @@
+-- Fingerprint of the (resume, description) pair a job was scored against
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS score_hash TEXT;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS scored_at TIMESTAMPTZ;
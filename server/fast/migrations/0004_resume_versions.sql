@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS resume_versions (
+    resume_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    collection_name TEXT NOT NULL UNIQUE,
+    filename TEXT,
+    is_active BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (resume_id, version)
+);
+
+-- At most one active version per resume
+CREATE UNIQUE INDEX IF NOT EXISTS resume_versions_active_idx ON resume_versions (resume_id) WHERE is_active;
@@ -0,0 +1,12 @@
+-- Checkpoints for /api/automate so failed or interrupted runs can resume
+CREATE TABLE IF NOT EXISTS automate_runs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    params JSONB NOT NULL,
+    last_step TEXT,
+    state JSONB DEFAULT '{}'::jsonb,
+    progress JSONB DEFAULT '{}'::jsonb,
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
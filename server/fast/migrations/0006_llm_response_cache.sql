@@ -0,0 +1,11 @@
+-- Responses of deterministic LLM calls keyed by a hash of model, parameters and rendered prompt
+CREATE TABLE IF NOT EXISTS llm_response_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    hits INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    last_hit_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS llm_response_cache_last_hit_idx ON llm_response_cache (last_hit_at);
@@ -0,0 +1,3 @@
+-- Description embeddings for the resume similarity prefilter
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS description_embedding vector;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
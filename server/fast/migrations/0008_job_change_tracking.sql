@@ -0,0 +1,4 @@
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS first_seen TIMESTAMPTZ DEFAULT now();
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ DEFAULT now();
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS last_changed TIMESTAMPTZ DEFAULT now();
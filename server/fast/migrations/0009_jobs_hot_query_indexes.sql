@@ -0,0 +1,5 @@
+-- get_job_description: WHERE curated = FALSE AND score > %s
+CREATE INDEX IF NOT EXISTS jobs_uncurated_score_idx ON jobs (score) WHERE curated = FALSE;
+
+-- get_jobs_table: ORDER BY score DESC LIMIT %s
+CREATE INDEX IF NOT EXISTS jobs_score_desc_idx ON jobs (score DESC);
@@ -0,0 +1,34 @@
+-- Scores, recommendations and curated resumes per (resume, job), so runs for different resumes never overwrite each other
+CREATE TABLE IF NOT EXISTS job_resume_results (
+    resume_id TEXT NOT NULL,
+    job_url TEXT NOT NULL REFERENCES jobs (job_url) ON DELETE CASCADE,
+    score INTEGER NOT NULL DEFAULT 0,
+    recommendations TEXT,
+    score_hash TEXT,
+    scored_at TIMESTAMPTZ DEFAULT now(),
+    curated BOOLEAN DEFAULT FALSE,
+    curated_resume TEXT,
+    PRIMARY KEY (resume_id, job_url)
+);
+
+-- Results stored on jobs were produced for the default resume
+INSERT INTO job_resume_results (resume_id, job_url, score, recommendations, score_hash, scored_at, curated, curated_resume)
+SELECT 'default', job_url, COALESCE(score, 0), recommendations, score_hash, scored_at, COALESCE(curated, FALSE), curated_resume
+FROM jobs
+WHERE job_url IS NOT NULL AND (score_hash IS NOT NULL OR score > 0 OR curated_resume IS NOT NULL)
+ON CONFLICT (resume_id, job_url) DO NOTHING;
+
+-- Dropping the columns also drops jobs_uncurated_score_idx and jobs_score_desc_idx
+ALTER TABLE jobs
+    DROP COLUMN IF EXISTS score,
+    DROP COLUMN IF EXISTS recommendations,
+    DROP COLUMN IF EXISTS curated,
+    DROP COLUMN IF EXISTS curated_resume,
+    DROP COLUMN IF EXISTS score_hash,
+    DROP COLUMN IF EXISTS scored_at;
+
+-- get_job_description: WHERE resume_id = %s AND curated = FALSE AND score > %s
+CREATE INDEX IF NOT EXISTS job_resume_results_uncurated_score_idx ON job_resume_results (resume_id, score) WHERE curated = FALSE;
+
+-- get_jobs_table: WHERE resume_id = %s ORDER BY score DESC LIMIT %s
+CREATE INDEX IF NOT EXISTS job_resume_results_score_desc_idx ON job_resume_results (resume_id, score DESC);
@@ -0,0 +1,6 @@
+-- Only runs created through the queue are requeued on startup, and only until they reach the attempt limit
+ALTER TABLE automate_runs ADD COLUMN IF NOT EXISTS queued BOOLEAN DEFAULT FALSE;
+ALTER TABLE automate_runs ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0;
+
+-- Runs queued before this migration started out with status 'queued' and cannot be told apart any more
+UPDATE automate_runs SET queued = TRUE WHERE status = 'queued';
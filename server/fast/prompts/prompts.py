@@ -64,6 +64,31 @@ generate_job_score_prompt = HumanMessagePromptTemplate.from_template(
     """
 )
 
+generate_batch_job_score_prompt = HumanMessagePromptTemplate.from_template(
+    """
+    IMPORTANT: Only use the context provided to compare against each job description. Score every job independently.
+
+    Here is the candidate's resume (retrieved context):
+    {context}
+
+    And here are the job descriptions, each starting with its job_id:
+    {jobs}
+
+    For each job, provide a single integer match score from 0 to 100 indicating how well the candidate matches the job.
+
+    Return your answer as a JSON array with exactly one object per job, in the following format:
+    [
+        {{
+            "job_id": <the job_id number of the job>,
+            "score": <integer between 0 and 100>,
+            "content": "<A concise explanation of the score, including job comparisons, suggestions, and recommendations.>"
+        }}
+    ]
+
+    Replace the placeholders with the actual values. Do not include any extra text outside the JSON array.
+    """
+)
+
 automate_prompt = HumanMessagePromptTemplate.from_template(
     """
     Use the job_scraper_get_jobs MCP tool to get jobs by filling the job_scraper_request with the following parameters:
@@ -72,6 +97,9 @@ automate_prompt = HumanMessagePromptTemplate.from_template(
     - results_wanted: {results_wanted}
     - hours_old: {hours_old}
     - country_indeed: {country_indeed}
+    - search_terms: {search_terms}
+    - locations: {locations}
+    - sites: {sites}
     Return ONLY the tool output, exactly as it was returned, in the following JSON format:
     [
         {{
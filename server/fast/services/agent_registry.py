@@ -0,0 +1,53 @@
+from services.utilities.mcp_util import MCPUtil
+from services.comparison_agent import ComparisonAgent
+from services.curation_agent import CurationAgent
+from services.orchestrator_agent import AgentService
+import asyncio
+import os
+import time
+
+# Seconds before the MCP tool list is fetched again and the orchestrator graph rebuilt
+MCP_TOOLS_TTL = float(os.environ.get("MCP_TOOLS_TTL", "300"))
+
+
+class AgentRegistry:
+    """
+    Owns the long-lived agents, MCP client and compiled graphs for the process.
+    Graphs are built lazily (or at startup) and reused by every request; the MCP tool list
+    is refreshed after MCP_TOOLS_TTL seconds or after a run fails.
+    """
+    def __init__(self, tools_ttl: float = MCP_TOOLS_TTL):
+        self.tools_ttl = tools_ttl
+        self.mcp_client = MCPUtil()
+        self.comparison_agent = ComparisonAgent()
+        self.curation_agent = CurationAgent()
+        self.agent_service = AgentService(self)
+        self._lock = asyncio.Lock()
+        self._orchestrator_graph = None
+        self._tools_loaded_at = 0.0
+
+    def is_stale(self) -> bool:
+        return self._orchestrator_graph is None or time.monotonic() - self._tools_loaded_at > self.tools_ttl
+
+    def invalidate(self):
+        """Force the tool list and orchestrator graph to be rebuilt on next use."""
+        self._tools_loaded_at = 0.0
+
+    async def get_orchestrator_graph(self):
+        """Return the compiled orchestrator graph, refreshing the MCP tools when they are stale."""
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    print("Loading MCP tools and building orchestrator graph...")
+                    await self.mcp_client.get_tools()
+                    self._orchestrator_graph = await self.agent_service.create_graph(self.mcp_client.tools)
+                    self._tools_loaded_at = time.monotonic()
+        return self._orchestrator_graph
+
+    async def startup(self):
+        """Build the graphs ahead of the first request. Failures are retried lazily on first use."""
+        try:
+            self.curation_agent.get_graph()
+            await self.get_orchestrator_graph()
+        except Exception as e:
+            print(f"Failed to build agents at startup: {e}")
@@ -0,0 +1,137 @@
+from services.orchestrator_agent import AgentService
+from services.utilities.database_util import get_automate_run, list_automate_runs, update_automate_run
+import asyncio
+import os
+
+# Number of automate runs executed at the same time
+AUTOMATE_WORKERS = int(os.environ.get("AUTOMATE_WORKERS", "1"))
+# Times a queued run is started before a restart stops requeueing it, so a run that crashes the server is not retried forever
+AUTOMATE_MAX_ATTEMPTS = int(os.environ.get("AUTOMATE_MAX_ATTEMPTS", "3"))
+
+
+class AutomateQueue:
+    """
+    In-process queue that runs automate requests in the background.
+    Runs are recorded in automate_runs, so their status and progress can be polled while they execute
+    and runs interrupted by a restart are picked up again on startup.
+    """
+    def __init__(self, agent_service: AgentService, workers: int = AUTOMATE_WORKERS):
+        self.agent_service = agent_service
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue()
+        self.running = {}
+        self.worker_tasks = []
+
+    async def start(self):
+        """
+        Start the workers and requeue the queued runs left queued or running by a previous process.
+        Runs from synchronous requests, whose caller is gone, and runs that reached AUTOMATE_MAX_ATTEMPTS are marked failed;
+        they can still be resumed by run_id.
+        """
+        for index in range(self.workers):
+            self.worker_tasks.append(asyncio.create_task(self.worker(index)))
+        try:
+            for status in ("running", "queued"):
+                runs = await asyncio.to_thread(list_automate_runs, status, 1000)
+                for run in reversed(runs):
+                    if not run["queued"]:
+                        error = "Interrupted by a server restart"
+                    elif (run["attempts"] or 0) >= AUTOMATE_MAX_ATTEMPTS:
+                        error = f"Interrupted after {run['attempts']} attempts"
+                    else:
+                        print(f"Requeueing {status} automate run {run['run_id']}")
+                        await asyncio.to_thread(update_automate_run, run["run_id"], status="queued")
+                        await self.queue.put(run["run_id"])
+                        continue
+                    print(f"Not requeueing {status} automate run {run['run_id']}: {error}")
+                    await asyncio.to_thread(update_automate_run, run["run_id"], status="failed", error=error)
+        except Exception as e:
+            # Recovery is best effort; the server still accepts new runs
+            print(f"Failed to requeue interrupted automate runs: {e}")
+
+    async def stop(self):
+        """Stop the workers. Interrupted runs stay in automate_runs and resume on the next start."""
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+
+    async def enqueue(self, **params) -> str:
+        """Record a queued run with the automate parameters and return its run_id."""
+        run_id = await asyncio.to_thread(self.agent_service.create_run, status="queued", **params)
+        await self.queue.put(run_id)
+        return run_id
+
+    async def run(self, run_id: str = None, **params) -> dict:
+        """
+        Execute an automate run in the caller's request, tracked like the queued runs so it can be cancelled.
+        A new run is recorded from params unless run_id names a run to resume.
+
+        Returns:
+            dict: run_id, status, error (if any) and the jobs table.
+        """
+        if run_id is None:
+            run_id = await asyncio.to_thread(self.agent_service.create_run, **params)
+        task = asyncio.create_task(self.agent_service.automate(run_id=run_id))
+        self.running[run_id] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # The request itself is being cancelled
+                task.cancel()
+                raise
+            print(f"Automate run {run_id} cancelled")
+            return {"run_id": run_id, "status": "cancelled", "jobs": []}
+        finally:
+            self.running.pop(run_id, None)
+
+    async def cancel(self, run_id: str):
+        """
+        Cancel a queued or running run.
+
+        Returns:
+            dict or None: The run after cancelling, or None if it does not exist.
+        """
+        run = await asyncio.to_thread(get_automate_run, run_id)
+        if run is None:
+            return None
+        if run["status"] in ("queued", "running", "pending"):
+            task = self.running.get(run_id)
+            if run["status"] == "running" and task is None:
+                # Started by another process; marking it cancelled here would not stop it
+                raise RuntimeError(f"Automate run {run_id} is not running in this server and cannot be cancelled")
+            # Queued runs are skipped by the workers; running runs are interrupted
+            await asyncio.to_thread(update_automate_run, run_id, status="cancelled")
+            if task:
+                task.cancel()
+        return await asyncio.to_thread(get_automate_run, run_id)
+
+    async def worker(self, index: int):
+        while True:
+            run_id = await self.queue.get()
+            try:
+                run = await asyncio.to_thread(get_automate_run, run_id)
+                if run is None or run["status"] != "queued":
+                    continue
+                print(f"Automate worker {index} starting run {run_id}")
+                task = asyncio.create_task(self.agent_service.automate(run_id=run_id))
+                self.running[run_id] = task
+                try:
+                    result = await task
+                    print(f"Automate worker {index} finished run {run_id}: {result['status']}")
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        # The worker itself is being stopped; leave the run to be requeued on startup
+                        task.cancel()
+                        raise
+                    print(f"Automate run {run_id} cancelled")
+                    await asyncio.to_thread(update_automate_run, run_id, status="cancelled")
+                finally:
+                    self.running.pop(run_id, None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Automate worker {index} failed on run {run_id}: {e}")
+            finally:
+                self.queue.task_done()
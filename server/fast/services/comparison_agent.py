@@ -1,63 +1,280 @@
-from prompts.prompts import system_prompt, generate_job_score_prompt
+from prompts.prompts import system_prompt, generate_job_score_prompt, generate_batch_job_score_prompt
 from langchain_core.prompts import ChatPromptTemplate
 from services import models
-from services.rag_service import get_context
-from services.utilities.database_util import get_all_jobs, update_job_score
-import json
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-LLM_MODEL = "nvidia/llama-3.3-nemotron-super-49b-v1"
+from services.rag_service import get_context, get_resume_collection, embed_job_descriptions, DEFAULT_RESUME_ID
+from services.utilities.database_util import get_jobs_to_score, get_score_hash, update_job_score
+from services.utilities.json_util import parse_job_score, parse_job_scores
+import asyncio
+import hashlib
+import os
+import threading
+from services.utilities.llm_gateway import llm_gateway
+
+# Scoring engine settings, overridable from the environment
+SCORING_CONCURRENCY = int(os.environ.get("SCORING_CONCURRENCY", "8"))
+# Timeout of each LLM call; throttling, server errors and timeouts are retried by the LLM gateway
+SCORING_TIMEOUT = float(os.environ.get("SCORING_TIMEOUT", "120"))
+# Attempts per job when the response has no usable score
+SCORING_MAX_ATTEMPTS = int(os.environ.get("SCORING_MAX_ATTEMPTS", "3"))
+# Completed scores are flushed to postgres in batches of this size
+SCORING_WRITE_BATCH = int(os.environ.get("SCORING_WRITE_BATCH", "10"))
+# Jobs packed into one scoring prompt, limited by the estimated prompt size; 1 scores every job on its own
+SCORING_BATCH_SIZE = int(os.environ.get("SCORING_BATCH_SIZE", "5"))
+SCORING_BATCH_TOKEN_BUDGET = int(os.environ.get("SCORING_BATCH_TOKEN_BUDGET", "12000"))
+# Embedding prefilter: only jobs whose description is at least this similar to the resume, and among the
+# SCORING_TOP_K most similar jobs, are sent to the LLM (0 disables either limit; both are off by default)
+SCORING_MIN_SIMILARITY = float(os.environ.get("SCORING_MIN_SIMILARITY", "0"))
+SCORING_TOP_K = int(os.environ.get("SCORING_TOP_K", "0"))
+
+_stats_lock = threading.Lock()
+# attempts, parsed and parse_failures count single-job calls; the batch_ counters count batched calls
+_stats = {"attempts": 0, "parsed": 0, "parse_failures": 0, "timeouts": 0, "llm_errors": 0, "retries": 0, "gave_up": 0, "batches": 0, "batch_parsed": 0, "batch_parse_failures": 0, "batched_jobs": 0, "batch_fallbacks": 0}
+
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def get_scoring_stats() -> dict:
+    """Return scoring attempt, parse-failure and retry counters, with separate parse failure rates for single and batched calls."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["parse_failure_rate"] = stats["parse_failures"] / stats["attempts"] if stats["attempts"] else 0.0
+    stats["batch_parse_failure_rate"] = stats["batch_parse_failures"] / stats["batches"] if stats["batches"] else 0.0
+    return stats
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting (about four characters per token)."""
+    return len(text) // 4 + 1
 
 
 class ComparisonAgent:
-    # Send the job description to the LLM and load the previously uploaded resume from the vectorstore into the context
-    def generate_job_scores(self):
+    # Send the job descriptions to the LLM concurrently and load the previously uploaded resume from the vectorstore into the context
+    async def generate_job_scores(self, force_rescore: bool = False, resume_id: str = DEFAULT_RESUME_ID, scored_before: str = None, progress_callback=None, max_concurrency: int = SCORING_CONCURRENCY, timeout: float = SCORING_TIMEOUT, max_attempts: int = SCORING_MAX_ATTEMPTS, batch_size: int = SCORING_BATCH_SIZE, token_budget: int = SCORING_BATCH_TOKEN_BUDGET, min_similarity: float = SCORING_MIN_SIMILARITY, top_k: int = SCORING_TOP_K):
+        """
+        Score the jobs that are new or changed against the resume with at most max_concurrency LLM calls in flight.
+        Jobs already scored against the same resume and description are skipped unless force_rescore is set;
+        scored_before limits a forced rescore to jobs not scored since that time.
+        Job descriptions are embedded first, and only jobs with cosine similarity to the resume of at least
+        min_similarity and among the top_k most similar jobs overall, scored or not, are scored by the LLM.
+        Up to batch_size jobs that fit token_budget share one prompt and one copy of the resume; jobs missing from a
+        batched answer are scored on their own.
+        Finished results are written to postgres in small batches as they complete.
+        progress_callback, if given, is awaited with {"total", "scored", "failed", "failed_jobs"} after every batch is written.
+        Jobs that fail are left unscored and listed by job_url in failed_jobs; the other jobs are still scored and saved.
+        """
         scores = []
-        recommendations = []
-        jobs = get_all_jobs()
-        resume = get_context()
-        for job in jobs:
-            description = job.get("description", "")
-            if description != "":
-                max_attempts = 5
-                attempt = 0
-                while attempt < max_attempts:
-                    job_score = self.job_score(' '.join(resume.split()), description)
-                    try:
-                        # Parse the job_score as JSON
-                        print(job_score)
-                        job_score_json = json.loads(job_score)
-                        score_val = job_score_json.get("score", 0)
-                        content_val = job_score_json.get("content", "")
-                        print(f"Job: {job.get('title')}")
-                        print(f"Score: {score_val}")
-                        scores.append(models.job(title=job.get("title"), job_url=job.get("job_url"), score=score_val))
-                        # Append a new job_comparisons entry using models.job_comparisons and job_score/job fields
-                        recommendations.append(
-                            models.job_comparisons(
-                                job_url=job.get("job_url"),
-                                score=score_val,
-                                content=content_val
-                            )
-                        )
-                        break
-                    except (ValueError, json.JSONDecodeError, TypeError) as e:
-                        print(f"Failed to parse job_score or convert score to int: {e}")
-                        attempt += 1
+        pending = []
+        resume = await asyncio.to_thread(get_context, resume_id)
+        resume = ' '.join(resume.split())
+        resume_hash = hashlib.md5(resume.encode("utf-8")).hexdigest()
+        collection_name = await asyncio.to_thread(get_resume_collection, resume_id)
+        try:
+            await asyncio.to_thread(embed_job_descriptions)
+        except Exception as e:
+            # Jobs without an embedding are never filtered out, so scoring still covers them
+            print(f"Failed to embed job descriptions, scoring without the similarity prefilter: {e}")
+        jobs = await asyncio.to_thread(
+            get_jobs_to_score,
+            resume_id,
+            resume_hash,
+            force_rescore,
+            scored_before,
+            collection_name,
+            min_similarity if min_similarity else None,
+            top_k if top_k else None
+        )
+        jobs = [job for job in jobs if job.get("description", "") != ""]
+        progress = {"total": len(jobs), "scored": 0, "failed": 0, "failed_jobs": []}
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        recorded = set()
+
+        def fail(job_url):
+            progress["failed"] += 1
+            progress["failed_jobs"].append(job_url)
+
+        def snapshot():
+            # The callback may serialize the progress off the event loop, so it gets its own copy
+            return {**progress, "failed_jobs": list(progress["failed_jobs"])}
+
+        async def flush():
+            # Swap the buffer out before awaiting so concurrent completions start a new batch
+            batch = pending[:]
+            pending.clear()
+            if not batch:
+                return
+            try:
+                written = await asyncio.to_thread(update_job_score, resume_id, [comparison for comparison, _ in batch])
+            except Exception as e:
+                # Only this batch is lost; the jobs stay unscored, so a resumed run scores them again
+                print(f"Failed to save {len(batch)} job scores: {e}")
+                written = {}
+            for comparison, scored_job in batch:
+                if written.get(comparison.job_url):
+                    scores.append(scored_job)
+                    progress["scored"] += 1
+                else:
+                    print(f"Failed to save score for job: {comparison.job_url}")
+                    fail(comparison.job_url)
+            if progress_callback:
+                await progress_callback(snapshot())
+
+        async def score(job):
+            async with semaphore:
+                result = await self.score_job(resume, job.get("description", ""), timeout, max_attempts, refresh=force_rescore)
+            if result is None:
+                print(f"Giving up on job: {job.get('title')}")
+                fail(job.get("job_url"))
+                return
+            await record(job, *result)
+
+        async def score_batch(batch):
+            if len(batch) == 1:
+                return await score(batch[0])
+            async with semaphore:
+                results = await self.score_batch(resume, batch, timeout * len(batch), refresh=force_rescore)
+            missing = []
+            for job in batch:
+                result = results.get(job.get("job_url"))
+                if result is None:
+                    missing.append(job)
+                else:
+                    await record(job, result["score"], result["content"])
+            if missing:
+                print(f"Batch scored {len(batch) - len(missing)} of {len(batch)} jobs, scoring the rest one by one.")
+                _count("batch_fallbacks", len(missing))
+                await asyncio.gather(*(score(job) for job in missing))
+
+        async def record(job, score_val, content_val):
+            print(f"Job: {job.get('title')}")
+            print(f"Score: {score_val}")
+            recorded.add(job.get("job_url"))
+            pending.append((
+                models.job_comparisons(
+                    job_url=job.get("job_url"),
+                    score=score_val,
+                    content=content_val,
+                    score_hash=get_score_hash(resume_hash, job.get("description", ""))
+                ),
+                models.job(title=job.get("title"), job_url=job.get("job_url"), score=score_val)
+            ))
+            # Commit results while the run is in progress so completed work survives a failure
+            if len(pending) >= SCORING_WRITE_BATCH:
+                await flush()
+
+        batches = self.build_batches(resume, jobs, batch_size, token_budget)
+        print(f"Scoring {len(jobs)} jobs in {len(batches)} prompts with concurrency {max_concurrency}.")
+        results = await asyncio.gather(*(score_batch(batch) for batch in batches), return_exceptions=True)
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(f"Failed to score job: {result}")
+                for job in batch:
+                    if job.get("job_url") not in recorded:
+                        fail(job.get("job_url"))
+        await flush()
+        if progress_callback:
+            await progress_callback(snapshot())
+
         sort_by_score = sorted(scores, key=lambda x: x.score, reverse=True)
-        update_job_score(recommendations)
         return sort_by_score
 
-    def job_score(self, resume, description):   
+    @staticmethod
+    def build_batches(resume: str, jobs: list, batch_size: int, token_budget: int) -> list[list]:
+        """Group jobs in order into batches of at most batch_size whose descriptions fit token_budget next to the resume."""
+        available = token_budget - estimate_tokens(resume)
+        batches = []
+        batch = []
+        used = 0
+        for job in jobs:
+            tokens = estimate_tokens(job.get("description", ""))
+            if batch and (len(batch) >= batch_size or used + tokens > available):
+                batches.append(batch)
+                batch = []
+                used = 0
+            batch.append(job)
+            used += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def score_batch(self, resume: str, jobs: list, timeout: float = SCORING_TIMEOUT, refresh: bool = False) -> dict:
+        """
+        Score several jobs with a single LLM call. Not retried; the caller scores missing jobs individually.
+
+        Returns:
+            dict: Maps job_url to {"score", "content"} for every job with a valid entry in the answer.
+        """
+        _count("batches")
+        try:
+            # Jobs are labelled 1..K instead of by URL, so the answer maps back reliably
+            job_urls = {str(index): job.get("job_url") for index, job in enumerate(jobs, start=1)}
+            jobs_text = "\n\n---\n\n".join(
+                f"job_id: {index}\n{' '.join(job.get('description', '').split())}" for index, job in enumerate(jobs, start=1)
+            )
+            prompt = ChatPromptTemplate.from_messages([system_prompt, generate_batch_job_score_prompt]).format_messages(context=resume, jobs=jobs_text)
+            print(f"Calculating job scores for a batch of {len(jobs)}.")
+            response = await llm_gateway.ainvoke("scoring", prompt, refresh=refresh, timeout=timeout)
+            results = {job_urls[job_id]: result for job_id, result in parse_job_scores(response.content, list(job_urls)).items()}
+            _count("batch_parsed")
+            _count("batched_jobs", len(results))
+            return results
+        except (asyncio.TimeoutError, TimeoutError):
+            print(f"Batch job score timed out after {timeout}s")
+            _count("timeouts")
+        except ValueError as e:
+            print(f"Failed to parse batch job scores: {e}")
+            _count("batch_parse_failures")
+        except Exception as e:
+            print(f"Batch job score failed: {e}")
+            _count("llm_errors")
+        return {}
+
+    async def score_job(self, resume: str, description: str, timeout: float = SCORING_TIMEOUT, max_attempts: int = SCORING_MAX_ATTEMPTS, refresh: bool = False):
+        """
+        Score a single job, retrying responses without a usable score.
+        Timeouts, throttling and server errors are already retried by the LLM gateway, so they end the job here.
+        Responses are parsed tolerantly, so only output with no recoverable {score, content} object is retried.
+        Cached responses are only used on the first attempt and not when refresh is set, so a bad cached
+        response is replaced by the retry.
+
+        Returns:
+            tuple or None: (score, content) on success, None once all attempts are exhausted.
+        """
+        for attempt in range(1, max_attempts + 1):
+            _count("attempts")
+            try:
+                job_score = await self.job_score(resume, description, refresh or attempt > 1, timeout)
+                parsed = parse_job_score(job_score)
+                _count("parsed")
+                return parsed["score"], parsed["content"]
+            except (asyncio.TimeoutError, TimeoutError):
+                print(f"Job score timed out after {timeout}s")
+                _count("timeouts")
+                break
+            except ValueError as e:
+                print(f"Failed to parse job_score: {e} (attempt {attempt}/{max_attempts})")
+                _count("parse_failures")
+            except Exception as e:
+                print(f"Job score failed: {e}")
+                _count("llm_errors")
+                break
+            if attempt < max_attempts:
+                _count("retries")
+        _count("gave_up")
+        return None
+
+    async def job_score(self, resume, description, refresh: bool = False, timeout: float = SCORING_TIMEOUT):
         """Handle message sending request."""
         try:
             prompt = ChatPromptTemplate.from_messages([system_prompt, generate_job_score_prompt]).format_messages(context=resume, question=description)
-            response = ""
 
             print(f"Calculating job score.")
-            llm = ChatNVIDIA(model=LLM_MODEL)
-            response = llm.invoke(prompt)
+            response = await llm_gateway.ainvoke("scoring", prompt, refresh=refresh, timeout=timeout)
 
             return response.content
 
         except Exception as e:
             print(f"Failed to call the llm {str(e)}")
+            raise
@@ -1,10 +1,11 @@
 
 from langgraph.graph import StateGraph, START, END
-from services.rag_service import get_context
+from services.rag_service import get_context, DEFAULT_RESUME_ID
 from services import models
 from services.utilities.database_util import get_job_description, update_job_curated_resume
 from typing_extensions import TypedDict
 from langchain.schema.runnable import RunnableLambda
+from langchain_core.runnables import RunnableConfig
 from langchain.prompts import ChatPromptTemplate
 from prompts.prompts import (
     curate_system_prompt,
@@ -13,45 +14,75 @@ from prompts.prompts import (
     curate_resume_step_3_cross_check_original,
     curate_resume_step_4_format,
 )
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-LLM_MODEL = "nvidia/llama-3.3-nemotron-super-49b-v1"
+from services.utilities.llm_gateway import llm_gateway
+import asyncio
+import os
+
+# Number of jobs whose curation chains run at the same time
+CURATION_CONCURRENCY = int(os.environ.get("CURATION_CONCURRENCY", "4"))
 
 class CurationAgent:
+    def __init__(self):
+        self.graph = None
+
+    def get_graph(self):
+        """Return the compiled curation graph, building it on first use."""
+        if self.graph is None:
+            self.graph = self.create_graph()
+        return self.graph
+
     def create_graph(self):
         try:
-            print("Creating LLM...")
-            llm = ChatNVIDIA(model=LLM_MODEL, temperature=0.7, max_tokens=2048)
-
             # State Management
             class State(TypedDict):
                 resume: str
+                resume_id: str
                 jobs: list[models.job]
                 min_job_score: int
+                curated_resumes: list
+                curation_progress: dict
 
             def get_resume(state: State) -> State:
                 print("Get latest resume from vector store.")
-                state['resume'] = get_context()
+                state['resume'] = get_context(state.get("resume_id", DEFAULT_RESUME_ID))
                 return state
 
             def get_job_data(state: State) -> State:
                 print("Get list of non curated jobs.")
-                state["jobs"] = get_job_description(state["min_job_score"])
+                state["jobs"] = get_job_description(state.get("resume_id", DEFAULT_RESUME_ID), state["min_job_score"])
                 return state
             
-            def curate(state: State) -> State:
+            async def curate(state: State, config: RunnableConfig) -> State:
+                progress_callback = (config.get("configurable") or {}).get("progress_callback")
                 jobs = state["jobs"]
                 if jobs and len(jobs) > 0:
                     curated_resumes = []
-                    for job in jobs:
-                        print(job.title)
-                        content = self.curate_resume_llm(llm, state["resume"], job.description, job.recommendations)
-                        job.curated_resume = content
-                        update_job_curated_resume(job)
-                        curated_resumes.append({
-                            "job_url": job.job_url,
-                            "curated_resume": job.curated_resume
-                        })
+                    progress = {"total": len(jobs), "done": 0, "failed": 0, "failed_jobs": []}
+                    semaphore = asyncio.Semaphore(max(1, CURATION_CONCURRENCY))
+
+                    async def curate_job(job):
+                        try:
+                            async with semaphore:
+                                print(job.title)
+                                job.curated_resume = await self.curate_resume_llm(state["resume"], job.description, job.recommendations)
+                            # Persist each curated resume as soon as its chain finishes
+                            await asyncio.to_thread(update_job_curated_resume, state.get("resume_id", DEFAULT_RESUME_ID), job)
+                            curated_resumes.append({
+                                "job_url": job.job_url,
+                                "curated_resume": job.curated_resume
+                            })
+                            progress["done"] += 1
+                        except Exception as e:
+                            print(f"Failed to curate resume for {job.job_url}: {e}")
+                            progress["failed"] += 1
+                            progress["failed_jobs"].append(job.job_url)
+                        print(f"Curation progress: {progress['done']} done, {progress['failed']} failed, {progress['total']} total")
+                        if progress_callback:
+                            await progress_callback({**progress, "failed_jobs": list(progress["failed_jobs"])})
+
+                    await asyncio.gather(*(curate_job(job) for job in jobs))
                     state["curated_resumes"] = curated_resumes
+                    state["curation_progress"] = progress
                 else:
                     print("No jobs found for curation")
                 return state
@@ -81,38 +112,46 @@ class CurationAgent:
             traceback.print_exc()
             raise
 
-    def curate_resume(self, min_job_score):
+    async def curate_resume(self, min_job_score, resume_id: str = DEFAULT_RESUME_ID, progress_callback=None):
         """Handle job curation agent orchestration request."""
         try:
-            agent = self.create_graph()
+            agent = self.get_graph()
 
             print("Call resume curation agent")
             print("------------------------------------")           
-            final_state = agent.invoke({"min_job_score": min_job_score})
+            final_state = await agent.ainvoke(
+                {"min_job_score": min_job_score, "resume_id": resume_id},
+                config={"configurable": {"progress_callback": progress_callback}}
+            )
             print("------------------------------------")  
             print("finished curation call")
             return final_state
         except Exception  as e:
             print(f"Error while running the curation resume agent: {e}")
-            return False
+            raise
+
+    async def curate_resume_llm(self, resume: str, job_description: str, recommendations: str):
+        # Each LLM step goes through the gateway, which caps calls in flight across the process
+        async def limited_llm(prompt):
+            return await llm_gateway.ainvoke("curation", prompt)
+        limited = RunnableLambda(limited_llm)
 
-    def curate_resume_llm(self, llm: ChatNVIDIA, resume: str, job_description: str, recommendations: str):
         # Chain with system_prompt at the start
         print(f"Begin the curation chain.")
         curation_chain_pipe = (
             ChatPromptTemplate.from_messages([curate_system_prompt, curate_resume_step_1_compare])
-            | llm
+            | limited
             | RunnableLambda(lambda output1: {"curated_resume": output1.content})
             | ChatPromptTemplate.from_messages([curate_system_prompt, curate_resume_step_2_proofread])
-            | llm
+            | limited
             | RunnableLambda(lambda output2: {"resume": resume, "curated_resume": output2.content})
             | ChatPromptTemplate.from_messages([curate_system_prompt, curate_resume_step_3_cross_check_original])
-            | llm
+            | limited
             | RunnableLambda(lambda output3: {"curated_resume": output3.content})
             | ChatPromptTemplate.from_messages([curate_system_prompt, curate_resume_step_4_format])
-            | llm
+            | limited
         )
 
-        result = curation_chain_pipe.invoke({"resume": resume, "job_description": job_description, "recommendations": recommendations})
+        result = await curation_chain_pipe.ainvoke({"resume": resume, "job_description": job_description, "recommendations": recommendations})
         content = result.content if hasattr(result, "content") else result
         return content
@@ -1,9 +1,8 @@
 from prompts.prompts import resume_revise_prompt, system_prompt, resume_review_prompt
 from typing import Generator
-from services.rag_service import get_context
+from services.rag_service import get_context, DEFAULT_RESUME_ID
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-LLM_MODEL = "nvidia/llama-3.3-nemotron-super-49b-v1"
+from services.utilities.llm_gateway import llm_gateway
 
 class LLMService:
     def __init__(self):
@@ -11,16 +10,15 @@ class LLMService:
         self.improvements = ""
 
     # Send the job description to the LLM and load the previously uploaded resume from the vectorstore into the context
-    def send_message(self, message) -> Generator[str, None, None]:   
+    def send_message(self, message, resume_id: str = DEFAULT_RESUME_ID) -> Generator[str, None, None]:   
         """Handle message sending request."""
         try:
-            context = get_context()
+            context = get_context(resume_id)
             prompt = ChatPromptTemplate.from_messages([system_prompt, resume_review_prompt]).format_messages(context=context, question=message)
             self.job_description = message
             response = ""
             print(f"Sending job description to LLM.")
-            llm = ChatNVIDIA(model=LLM_MODEL, streaming=True) 
-            for chunk in llm.stream(prompt):
+            for chunk in llm_gateway.stream("chat", prompt):
                 if chunk.content:
                     response += chunk.content
                     yield chunk.content 
@@ -33,15 +31,14 @@ class LLMService:
             raise RuntimeError(f"Error getting AI response: {str(e)}")
 
     # Revise the resume based on the job description and the improvements from the LLM
-    def revise_resume(self) -> Generator[str, None, None]:
+    def revise_resume(self, resume_id: str = DEFAULT_RESUME_ID) -> Generator[str, None, None]:
         """Handle resume revision request."""
         try:
-            context = get_context()
+            context = get_context(resume_id)
             prompt = ChatPromptTemplate.from_messages([system_prompt, resume_revise_prompt]).format_messages(resume=context, improvements = self.improvements, job_description=self.job_description)
             response = ""
             print(f"Revising resume.")
-            llm = ChatNVIDIA(model=LLM_MODEL, streaming=True) 
-            for chunk in llm.stream(prompt):
+            for chunk in llm_gateway.stream("chat", prompt):
                 if chunk.content:
                     response += chunk.content
                     yield chunk.content 
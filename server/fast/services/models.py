@@ -12,7 +12,8 @@ class job:
         self.curated_resume = curated_resume
 
 class job_comparisons:
-    def __init__(self, job_url: str = "", score: int = 0, content: str = ""):
+    def __init__(self, job_url: str = "", score: int = 0, content: str = "", score_hash: str = None):
         self.job_url = job_url
         self.score = score
-        self.content = content
\ No newline at end of file
+        self.content = content
+        self.score_hash = score_hash
\ No newline at end of file
@@ -1,29 +1,40 @@
 from prompts.prompts import automate_prompt, system_prompt
-from services.utilities.mcp_util import MCPUtil
-from services.comparison_agent import ComparisonAgent
-from services.curation_agent import CurationAgent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.messages import ToolMessage
 import json
+import uuid
+import asyncio
 from typing import List, Annotated
 from typing_extensions import TypedDict
 from langgraph.graph.message import AnyMessage, add_messages
-from .utilities.database_util import get_jobs_table
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-LLM_MODEL = "nvidia/llama-3.3-nemotron-super-49b-v1"
+from .utilities.database_util import get_jobs_table, create_automate_run, get_automate_run, update_automate_run, start_automate_run, finish_automate_run
+from services.rag_service import DEFAULT_RESUME_ID
+from services.utilities.llm_gateway import llm_gateway
+
+# Where a resumed run continues, keyed by the last step it completed
+RESUME_ROUTES = {
+    None: "chat_node",
+    "parse_jobs_node": "score_jobs_node",
+    "score_jobs_node": "curate_resume_node",
+    "curate_resume_node": END,
+}
+
+def save_step(run_id: str, step: str, state: dict = None, **fields):
+    """Checkpoint a completed graph step and the state needed to continue after it."""
+    if run_id:
+        update_automate_run(run_id, last_step=step, state=state or {}, **fields)
 
 class AgentService:
-    async def create_graph(self):
-        try:
-            print("Creating LLM...")
-            llm = ChatNVIDIA(model=LLM_MODEL)
-            mcp_client = MCPUtil()
-            await mcp_client.get_tools()
+    def __init__(self, registry):
+        # AgentRegistry that owns the compiled graph, MCP tools and shared agents
+        self.registry = registry
 
+    async def create_graph(self, tools):
+        try:
             print("Binding tools to LLM...")
-            llm_with_tool = llm.bind_tools(mcp_client.tools)
+            llm_with_tool = llm_gateway.get_llm("orchestrator").bind_tools(tools)
 
             print("Creating prompt template...")
             prompt_template = ChatPromptTemplate.from_messages([
@@ -38,12 +49,20 @@ class AgentService:
                 parsed_jobs: dict
                 job_scores: dict
                 curated_resume: dict
+                failed_jobs: dict
                 min_job_score: int
+                min_similarity: float
+                similarity_top_k: int
+                force_rescore: bool
+                resume_id: str
+                run_id: str
+                run_started_at: str
+                resume_from: str
 
             # Nodes
             def chat_node(state: State) -> State:
                 print("Use the job scraper service to get the latest jobs.")
-                state["messages"] = chat_llm.invoke({"messages": state["messages"]})
+                state["messages"] = llm_gateway.invoke("orchestrator", {"messages": state["messages"]}, runnable=chat_llm)
                 return state
 
             def parse_tool_json(state: State) -> State:
@@ -59,6 +78,10 @@ class AgentService:
                 for msg in tool_messages:
                     try:
                         raw_list = json.loads(msg.content)
+                        # The scraper returns {"jobs": [...], "sites": {...}, "saved": {...}}; older versions return the job list directly
+                        if isinstance(raw_list, dict):
+                            print(f"Job scrape by site: {raw_list.get('sites')}, saved: {raw_list.get('saved')}")
+                            raw_list = raw_list.get("jobs") or []
                         # In case each item is still a stringified JSON object
                         job_list = [
                             json.loads(item) if isinstance(item, str) else item
@@ -70,6 +93,8 @@ class AgentService:
 
                 # Store in state for downstream usage
                 state["parsed_jobs"] = parsed_results
+                if parsed_results:
+                    save_step(state.get("run_id"), "parse_jobs_node", {"parsed_jobs": parsed_results})
                 return state
 
             # Custom conditional function for parse_jobs_node
@@ -84,49 +109,104 @@ class AgentService:
                 return "score_jobs_node"
 
             # Define a new node for scoring jobs after parse_jobs_node
-            def score_jobs_node(state: State):
+            async def score_jobs_node(state: State):
                 """
                 Node to score jobs using the ComparisonAgent after jobs have been parsed.
                 """
+                run_id = state.get("run_id")
+                progress = {}
+
+                async def on_progress(scoring_progress):
+                    progress.update(scoring_progress)
+                    if run_id:
+                        await asyncio.to_thread(update_automate_run, run_id, progress={"scoring": scoring_progress})
+
+                # Unset prefilter parameters fall back to the scoring defaults
+                prefilter = {}
+                if state.get("min_similarity") is not None:
+                    prefilter["min_similarity"] = state["min_similarity"]
+                if state.get("similarity_top_k") is not None:
+                    prefilter["top_k"] = state["similarity_top_k"]
+
                 try:
-                    comparison_agent = ComparisonAgent()
-                    sort_by_score = comparison_agent.generate_job_scores()
-                    # Optionally, update the state with scores if needed
-                    state["job_scores"] = sort_by_score
+                    comparison_agent = self.registry.comparison_agent
+                    sort_by_score = await comparison_agent.generate_job_scores(
+                        force_rescore=state.get("force_rescore", False),
+                        resume_id=state.get("resume_id", DEFAULT_RESUME_ID),
+                        scored_before=state.get("run_started_at"),
+                        progress_callback=on_progress,
+                        **prefilter
+                    )
+                    # Jobs that failed are left unscored and recorded on the run; the run only fails if none could be scored
+                    if progress.get("total") and not progress.get("scored"):
+                        raise RuntimeError(f"Failed to score all {progress['total']} jobs")
+                    if progress.get("failed"):
+                        print(f"Failed to score {progress['failed']} of {progress['total']} jobs, continuing with the rest")
+                    state["failed_jobs"] = {**(state.get("failed_jobs") or {}), "scoring": progress.get("failed_jobs") or []}
+                    state["job_scores"] = [
+                        {"title": job.title, "job_url": job.job_url, "score": job.score}
+                        for job in sort_by_score
+                    ]
+                    await asyncio.to_thread(save_step, run_id, "score_jobs_node", {"job_scores": state["job_scores"], "failed_jobs": state["failed_jobs"]})
                     return state
                 except Exception as e:
                     print(f"Error in score_jobs_node: {e}")
                     import traceback
                     traceback.print_exc()
-                    return state
+                    raise
                 
-            def curate_resume_node(state: State):
+            async def curate_resume_node(state: State):
                 """
                 Node to curate the resume using the CurationAgent.
                 """
+                run_id = state.get("run_id")
+
+                async def on_progress(curation_progress):
+                    if run_id:
+                        await asyncio.to_thread(update_automate_run, run_id, progress={"curation": curation_progress})
+
                 try:
                     print("curate Agent")
-                    curation_agent = CurationAgent()
-                    curated_resume = curation_agent.curate_resume(state["min_job_score"])
-                    state["curated_resume"] = curated_resume
+                    curation_agent = self.registry.curation_agent
+                    curated_resume = await curation_agent.curate_resume(
+                        state["min_job_score"],
+                        state.get("resume_id", DEFAULT_RESUME_ID),
+                        progress_callback=on_progress
+                    )
+                    # Curated jobs are saved as they finish; failed ones are recorded and picked up by the next run
+                    progress = curated_resume.get("curation_progress") or {}
+                    if progress.get("total") and not progress.get("done"):
+                        raise RuntimeError(f"Failed to curate all {progress['total']} jobs")
+                    if progress.get("failed"):
+                        print(f"Failed to curate {progress['failed']} of {progress['total']} jobs")
+                    state["failed_jobs"] = {**(state.get("failed_jobs") or {}), "curation": progress.get("failed_jobs") or []}
+                    state["curated_resume"] = {
+                        "curated_jobs": [item["job_url"] for item in curated_resume.get("curated_resumes") or []]
+                    }
+                    await asyncio.to_thread(save_step, run_id, "curate_resume_node", {"curated_resume": state["curated_resume"], "failed_jobs": state["failed_jobs"]})
                     return state
                 except Exception as e:
                     print(f"Error in curate_resume_node: {e}")
                     import traceback
                     traceback.print_exc()
-                    return state
+                    raise
 
             print("Building graph...")
             # Building the graph
             graph_builder = StateGraph(State)
             #Create graph nodes
             graph_builder.add_node("chat_node", chat_node)
-            graph_builder.add_node("tool_node", ToolNode(tools=mcp_client.tools))
+            graph_builder.add_node("tool_node", ToolNode(tools=tools))
             graph_builder.add_node("parse_jobs_node", parse_tool_json)
             graph_builder.add_node("score_jobs_node", score_jobs_node)
             graph_builder.add_node("curate_resume_node", curate_resume_node)
             #Create graph edges
-            graph_builder.add_edge(START, "chat_node")
+            # New runs start at chat_node; resumed runs skip the steps they already completed
+            graph_builder.add_conditional_edges(
+                START,
+                lambda state: RESUME_ROUTES.get(state.get("resume_from"), "chat_node"),
+                {"chat_node": "chat_node", "score_jobs_node": "score_jobs_node", "curate_resume_node": "curate_resume_node", END: END}
+            )
             # If tools are needed, go to tool_node; otherwise, end.
             graph_builder.add_conditional_edges("chat_node", tools_condition, {"tools": "tool_node", "__end__": END})
             # After tool_node, go to parse_tool_output. If tool_node fails, end.
@@ -144,21 +224,109 @@ class AgentService:
             traceback.print_exc()
             raise
 
-    async def automate(self, search_term: str = "software engineer", location: str = "", results_wanted: int = 10, hours_old: int = 24, country_indeed: str = "USA", min_job_score: int = 60):
-        """Handle automated agent orchestration request."""
+    def create_run(self, search_term: str = "software engineer", location: str = "", results_wanted: int = 10, hours_old: int = 24, country_indeed: str = "USA", min_job_score: int = 60, force_rescore: bool = False, resume_id: str = DEFAULT_RESUME_ID, min_similarity: float = None, similarity_top_k: int = None, search_terms: list[str] = None, locations: list[str] = None, sites: list[str] = None, status: str = "pending") -> str:
+        """Record a new automate run and return its run_id."""
+        run_id = uuid.uuid4().hex
+        params = {
+            "search_term": search_term,
+            "location": location,
+            "results_wanted": results_wanted,
+            "hours_old": hours_old,
+            "country_indeed": country_indeed,
+            "min_job_score": min_job_score,
+            "force_rescore": force_rescore,
+            "resume_id": resume_id,
+            "min_similarity": min_similarity,
+            "similarity_top_k": similarity_top_k,
+            "search_terms": search_terms or [],
+            "locations": locations or [],
+            "sites": sites or ["indeed"],
+        }
+        create_automate_run(run_id, params, status, queued=status == "queued")
+        return run_id
+
+    async def automate(self, search_term: str = "software engineer", location: str = "", results_wanted: int = 10, hours_old: int = 24, country_indeed: str = "USA", min_job_score: int = 60, force_rescore: bool = False, resume_id: str = DEFAULT_RESUME_ID, min_similarity: float = None, similarity_top_k: int = None, search_terms: list[str] = None, locations: list[str] = None, sites: list[str] = None, run_id: str = None):
+        """
+        Handle automated agent orchestration request.
+        Every run is checkpointed in automate_runs; pass the run_id of a failed or interrupted run to resume it
+        from its last completed step with its original parameters.
+        Jobs that fail to score or curate on their own are skipped and the run finishes as completed_with_errors;
+        the run only fails on errors that stop every job, such as a database outage or a missing resume.
+
+        Returns:
+            dict: run_id, status, error (if any), failed_jobs per step (if any) and the jobs table.
+        """
+        if run_id:
+            run = await asyncio.to_thread(get_automate_run, run_id)
+            if run is None:
+                raise ValueError(f"Automate run {run_id} not found")
+            if run["status"] in ("completed", "completed_with_errors", "cancelled"):
+                jobs = await asyncio.to_thread(get_jobs_table, run["params"]["resume_id"]) if run["status"] != "cancelled" else []
+                return {"run_id": run_id, "status": run["status"], "jobs": jobs}
+            if run["last_step"]:
+                print(f"Resuming automate run {run_id} after step {run['last_step']}")
+        else:
+            run_id = await asyncio.to_thread(
+                self.create_run,
+                search_term=search_term,
+                location=location,
+                results_wanted=results_wanted,
+                hours_old=hours_old,
+                country_indeed=country_indeed,
+                min_job_score=min_job_score,
+                force_rescore=force_rescore,
+                resume_id=resume_id,
+                min_similarity=min_similarity,
+                similarity_top_k=similarity_top_k,
+                search_terms=search_terms,
+                locations=locations,
+                sites=sites
+            )
+            run = await asyncio.to_thread(get_automate_run, run_id)
+        params = run["params"]
+
         try:
-            agent = await self.create_graph()
+            await asyncio.to_thread(start_automate_run, run_id)
+            agent = await self.registry.get_orchestrator_graph()
 
-            print("Call resume agent")
+            print(f"Call resume agent for run {run_id}")
             print("------------------------------------")           
-            final_state = await agent.ainvoke({"min_job_score": min_job_score, "messages": [automate_prompt.format(search_term=search_term, 
-                                                                                    location=location, 
-                                                                                    results_wanted=results_wanted, 
-                                                                                    hours_old=hours_old, 
-                                                                                    country_indeed=country_indeed)],})
+            initial_state = {
+                **run["state"],
+                "min_job_score": params["min_job_score"],
+                "force_rescore": params["force_rescore"],
+                "resume_id": params["resume_id"],
+                "min_similarity": params.get("min_similarity"),
+                "similarity_top_k": params.get("similarity_top_k"),
+                "run_id": run_id,
+                "run_started_at": run["created_at"],
+                "resume_from": run["last_step"],
+                "messages": [automate_prompt.format(search_term=params["search_term"], 
+                                                    location=params["location"], 
+                                                    results_wanted=params["results_wanted"], 
+                                                    hours_old=params["hours_old"], 
+                                                    country_indeed=params["country_indeed"],
+                                                    search_terms=json.dumps(params.get("search_terms") or []),
+                                                    locations=json.dumps(params.get("locations") or []),
+                                                    sites=json.dumps(params.get("sites") or ["indeed"]))],
+            }
+            final_state = await agent.ainvoke(initial_state)
             print("------------------------------------")  
             print("finished call")
-            return get_jobs_table()
+            # Jobs that failed on their own do not fail the run; they are listed in the run state
+            failed_jobs = {step: job_urls for step, job_urls in (final_state.get("failed_jobs") or {}).items() if job_urls}
+            status = "completed_with_errors" if failed_jobs else "completed"
+            error = "; ".join(f"{len(job_urls)} jobs failed {step}" for step, job_urls in failed_jobs.items()) or None
+            if not await asyncio.to_thread(finish_automate_run, run_id, status, error):
+                return {"run_id": run_id, "status": "cancelled", "jobs": []}
+            return {"run_id": run_id, "status": status, "failed_jobs": failed_jobs, "jobs": await asyncio.to_thread(get_jobs_table, params["resume_id"])}
         except Exception  as e:
             print(f"Error while running the automated resume agent: {e}")
-            return []
+            # The MCP server may have restarted or changed its tools; rebuild before the next run
+            self.registry.invalidate()
+            try:
+                if not await asyncio.to_thread(finish_automate_run, run_id, "failed", str(e)):
+                    return {"run_id": run_id, "status": "cancelled", "jobs": []}
+            except Exception as update_error:
+                print(f"Failed to record automate run failure: {update_error}")
+            return {"run_id": run_id, "status": "failed", "error": str(e), "jobs": []}
@@ -1,213 +1,866 @@
-import psycopg2
 from services import models
+from psycopg2.extras import execute_values, Json
+from services.utilities.postgres_pool import get_postgres_connection
+import hashlib
 import os
 
-def get_postgres_connection():
+RESUME_CHUNK_PAGE_SIZE = int(os.environ.get("RESUME_CHUNK_PAGE_SIZE", "500"))
+
+# Hot queries on the per-resume job results; their index use is checked by migrations.check_query_plans
+JOBS_TO_CURATE_QUERY = """
+    SELECT j.title, j.job_url, r.score, j.description, r.recommendations, r.curated
+    FROM job_resume_results r JOIN jobs j ON j.job_url = r.job_url
+    WHERE r.resume_id = %s AND r.curated = FALSE AND r.score > %s;
+"""
+JOBS_TABLE_QUERY = """
+    SELECT j.title, j.company, j.job_url, j.location, j.is_remote, r.curated, r.score
+    FROM job_resume_results r JOIN jobs j ON j.job_url = r.job_url
+    WHERE r.resume_id = %s
+    ORDER BY r.score DESC LIMIT %s;
+"""
+
+def get_score_hash(resume_hash: str, description: str) -> str:
     """
-    Establish and return a connection to the PostgreSQL database.
+    Fingerprint a (resume version, job description) pair.
+    Matches md5(resume_hash || description) computed by postgres so the filter in get_jobs_to_score stays in SQL.
     """
-    try:
-        conn = psycopg2.connect(
-            dbname=os.environ.get("POSTGRES_DB", "resume_agent"),
-            user=os.environ.get("POSTGRES_USER", "vector_admin"),
-            password=os.environ.get("POSTGRES_PASSWORD", "Resume_Pass"), 
-            host="pgvector-db",
-            port=5432
-        )
-        return conn
-    except Exception as e:
-        print(f"Error connecting to postgres: {e}")
-        raise
+    return hashlib.md5(f"{resume_hash}{description}".encode("utf-8")).hexdigest()
 
-def get_all_jobs():
+def get_jobs_to_score(resume_id: str, resume_hash: str, force_rescore: bool = False, scored_before: str = None, collection_name: str = None, min_similarity: float = None, top_k: int = None):
     """
-    Retrieve all job records from the PostgreSQL jobs table and return as a JSON array.
+    Retrieve the jobs whose description has not been scored against the given resume version.
+    With collection_name, every job is ranked by cosine similarity between its description embedding and the
+    mean embedding of the resume chunks, and only jobs at or above min_similarity and within the top_k most
+    similar jobs are returned. Jobs are ranked before already-scored ones are dropped, so top_k bounds the
+    jobs a resume is ever scored against instead of moving down the ranking on every run.
+    Jobs without an embedding are never filtered out.
+
+    Args:
+        resume_id (str): Identifier of the resume the jobs will be scored against.
+        resume_hash (str): Fingerprint of the resume version the jobs will be scored against.
+        force_rescore (bool): Return every job with a description, even if it was already scored.
+        scored_before (str, optional): With force_rescore, skip jobs scored at or after this timestamp,
+                                       so a resumed run does not rescore the jobs it already finished.
+        collection_name (str, optional): Collection holding the resume embeddings.
+        min_similarity (float, optional): Minimum cosine similarity between resume and job description.
+        top_k (int, optional): Only consider the top_k jobs most similar to the resume.
 
     Returns:
-        list: List of job dicts with all fields from the jobs table.
+        list: List of job dicts with title, company, job_url, description, location, is_remote and similarity.
     """
-    conn = None
     try:
-        conn = get_postgres_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT title, company, job_url, description, location, is_remote FROM jobs;")
-        rows = cur.fetchall()
-        jobs = []
-        for row in rows:
-            jobs.append({
-                "title": row[0],
-                "company": row[1],
-                "job_url": row[2],
-                "description": row[3],
-                "location": row[4],
-                "is_remote": row[5]
-            })
-        return jobs
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                WITH resume AS (
+                    SELECT AVG(e.embedding) AS embedding
+                    FROM langchain_pg_embedding e
+                    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+                    WHERE c.name = %s
+                ), ranked AS (
+                    -- Rank every job, scored or not; jobs without an embedding sort last and keep a NULL similarity
+                    SELECT j.job_url,
+                           1 - (j.description_embedding <=> resume.embedding) AS similarity,
+                           row_number() OVER (ORDER BY j.description_embedding <=> resume.embedding NULLS LAST) AS rank
+                    FROM jobs j CROSS JOIN resume
+                    WHERE j.description IS NOT NULL AND j.description <> ''
+                )
+                SELECT j.title, j.company, j.job_url, j.description, j.location, j.is_remote, ranked.similarity
+                FROM ranked
+                JOIN jobs j ON j.job_url = ranked.job_url
+                LEFT JOIN job_resume_results r ON r.job_url = j.job_url AND r.resume_id = %s
+                WHERE (
+                          (%s AND (%s::timestamptz IS NULL OR r.scored_at IS NULL OR r.scored_at < %s::timestamptz))
+                          OR r.score_hash IS DISTINCT FROM md5(%s || j.description)
+                      )
+                  AND (
+                          ranked.similarity IS NULL
+                          OR ((%s::float IS NULL OR ranked.similarity >= %s::float) AND (%s::int IS NULL OR ranked.rank <= %s::int))
+                      )
+                ORDER BY ranked.similarity DESC NULLS FIRST;
+                """,
+                (collection_name, resume_id, force_rescore, scored_before, scored_before, resume_hash, min_similarity, min_similarity, top_k, top_k)
+            )
+            rows = cur.fetchall()
+            jobs = []
+            for row in rows:
+                jobs.append({
+                    "title": row[0],
+                    "company": row[1],
+                    "job_url": row[2],
+                    "description": row[3],
+                    "location": row[4],
+                    "is_remote": row[5],
+                    "similarity": row[6]
+                })
+            return jobs
     except Exception as e:
-        print(f"Error retrieving jobs from postgres: {e}")
-        if conn:
-            conn.rollback()
+        print(f"Error retrieving jobs to score from postgres: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def update_job_score(jobs_with_scores: models.job_comparisons):
+def update_job_score(resume_id: str, jobs_with_scores: models.job_comparisons):
     """
-    Update the score field in the jobs table for each job using job_url as the unique identifier.
+    Save the score of each job against a resume in job_resume_results, keyed by (resume_id, job_url).
+    All rows are applied in a single INSERT ... SELECT FROM (VALUES ...) ON CONFLICT statement.
+    A score for a different resume/description pair marks the job as not curated for that resume and drops its stale curated resume.
 
     Args:
+        resume_id (str): Identifier of the resume the jobs were scored against.
         jobs_with_scores (list): List of dicts, each containing at least 'job_url' and 'score'.
+                                 An optional 'score_hash' marks the resume/description pair as scored.
+
+    Returns:
+        dict: Maps each job_url to True if a result was saved, False otherwise (for example if the job no longer exists).
     """
-    conn = None
+    rows = {}
+    for job in jobs_with_scores:
+        if job.job_url is not None and job.score is not None:
+            content = ' '.join(str(job.content or "").split())
+            rows[job.job_url] = (resume_id, job.job_url, job.score, content, job.score_hash)
+    results = {job.job_url: False for job in jobs_with_scores}
+    if not rows:
+        return results
     try:
-        conn = get_postgres_connection()
-        cur = conn.cursor()
-        for job in jobs_with_scores:
-            job_url = job.job_url
-            score = job.score
-            content = ' '.join(job.content.split())
-            if job_url is not None and score is not None:
-                cur.execute(
-                    "UPDATE jobs SET score = %s, recommendations = %s WHERE job_url = %s;",
-                    (score, content, job_url)
-                )
-        conn.commit()
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            updated = execute_values(
+                cur,
+                """
+                INSERT INTO job_resume_results (resume_id, job_url, score, recommendations, score_hash, scored_at)
+                SELECT v.resume_id, v.job_url, v.score, v.recommendations, v.score_hash, now()
+                FROM (VALUES %s) AS v(resume_id, job_url, score, recommendations, score_hash)
+                JOIN jobs ON jobs.job_url = v.job_url
+                ON CONFLICT (resume_id, job_url) DO UPDATE
+                SET score = EXCLUDED.score,
+                    recommendations = EXCLUDED.recommendations,
+                    score_hash = EXCLUDED.score_hash,
+                    scored_at = EXCLUDED.scored_at,
+                    curated = CASE
+                        WHEN job_resume_results.score_hash IS DISTINCT FROM EXCLUDED.score_hash THEN FALSE
+                        ELSE job_resume_results.curated END,
+                    curated_resume = CASE
+                        WHEN job_resume_results.score_hash IS DISTINCT FROM EXCLUDED.score_hash THEN NULL
+                        ELSE job_resume_results.curated_resume END
+                RETURNING job_url;
+                """,
+                list(rows.values()),
+                template="(%s::text, %s, %s::integer, %s::text, %s::text)",
+                page_size=len(rows),
+                fetch=True
+            )
+            conn.commit()
+        for (job_url,) in updated:
+            results[job_url] = True
+        return results
     except Exception as e:
         print(f"Error updating job scores in postgres: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def get_job_description(min_job_score: int = 60) -> list[models.job]:
+def get_job_description(resume_id: str, min_job_score: int = 60) -> list[models.job]:
     """
-    Retrieve job records from the PostgreSQL jobs table that are not curated and return as a JSON array.
+    Retrieve the jobs scored above min_job_score against a resume that are not yet curated for it.
 
     Returns:
         list: List of job dicts that are not curated and returns the title, job_url, description, and recommendations.
     """
-    conn = None
-    try:
-        conn = get_postgres_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT title, job_url, score, description, recommendations, curated FROM jobs WHERE curated = FALSE AND score > %s;", (min_job_score,))
-        rows = cur.fetchall()
-        jobs = []
-        for row in rows:
-            jobs.append(
-                models.job(
-                    title=row[0],
-                    job_url=row[1],
-                    score=row[2],
-                    description=row[3],
-                    recommendations=row[4],
-                    curated=row[5]
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(JOBS_TO_CURATE_QUERY, (resume_id, min_job_score))
+            rows = cur.fetchall()
+            jobs = []
+            for row in rows:
+                jobs.append(
+                    models.job(
+                        title=row[0],
+                        job_url=row[1],
+                        score=row[2],
+                        description=row[3],
+                        recommendations=row[4],
+                        curated=row[5]
+                    )
                 )
-            )
-        return jobs
+            return jobs
     except Exception as e:
         print(f"Error retrieving jobs from postgres: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def update_job_curated_resume(updated_job: models.job):
+def update_job_curated_resume(resume_id: str, updated_job: models.job):
     """
-    Update the curated_resume field in the jobs table using job_url as the unique identifier.
+    Save the resume curated for a job, keyed by (resume_id, job_url).
 
     Args:
+        resume_id (str): Identifier of the resume that was curated.
         updated_job: job class, each containing at least 'job_url' and 'curated_resume'.
     """
-    conn = None
     try:
-        conn = get_postgres_connection()
-        cur = conn.cursor()
-        job_url = updated_job.job_url
-        curated_resume = updated_job.curated_resume
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            job_url = updated_job.job_url
+            curated_resume = updated_job.curated_resume
         
-        if job_url is not None and curated_resume is not None:
-            cur.execute(
-                "UPDATE jobs SET curated_resume = %s, curated = TRUE WHERE job_url = %s;",
-                (curated_resume, job_url)
-            )
-        conn.commit()
+            if job_url is not None and curated_resume is not None:
+                cur.execute(
+                    "UPDATE job_resume_results SET curated_resume = %s, curated = TRUE WHERE resume_id = %s AND job_url = %s;",
+                    (curated_resume, resume_id, job_url)
+                )
+            conn.commit()
     except Exception as e:
         print(f"Error updating job scores in postgres: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def get_jobs_table(limit: int=10):
+def get_jobs_table(resume_id: str, limit: int=10):
     """
-    Retrieve all job records from the PostgreSQL jobs table and return as a JSON array.
+    Retrieve the highest scoring jobs for a resume and return as a JSON array.
 
     Returns:
-        list: List of job dicts with all fields from the jobs table.
+        list: List of job dicts with the job fields and the resume's score and curated flag.
     """
-    conn = None
     try:
-        conn = get_postgres_connection()
-        cur = conn.cursor()
-        # The parameter for LIMIT must be a tuple, even if it's a single value
-        cur.execute("SELECT title, company, job_url, location, is_remote, curated, score FROM jobs ORDER BY score DESC LIMIT %s;", (limit,))
-        rows = cur.fetchall()
-        jobs = []
-        for row in rows:
-            jobs.append({
-                "title": row[0],
-                "company": row[1],
-                "job_url": row[2],
-                "location": row[3],
-                "is_remote": row[4],
-                "curated": row[5],
-                "score": row[6]
-            })
-        return jobs
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(JOBS_TABLE_QUERY, (resume_id, limit))
+            rows = cur.fetchall()
+            jobs = []
+            for row in rows:
+                jobs.append({
+                    "title": row[0],
+                    "company": row[1],
+                    "job_url": row[2],
+                    "location": row[3],
+                    "is_remote": row[4],
+                    "curated": row[5],
+                    "score": row[6]
+                })
+            return jobs
     except Exception as e:
         print(f"Error retrieving jobs from postgres: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def get_curated_resume(job_url: str):
+def get_curated_resume(job_url: str, resume_id: str):
     """
-    Retrieve the curated resume string for a specific job from the PostgreSQL jobs table.
+    Retrieve the resume curated for a specific job from a specific resume.
 
     Args:
         job_url (str): The unique URL identifier for the job.
+        resume_id (str): Identifier of the resume that was curated.
 
     Returns:
-        str or None: The curated_resume string for the specified job, or None if not found.
+        tuple or None: (title, curated_resume) for the specified job and resume, or None if not found.
     """
-    conn = None
     try:
         if not job_url or job_url == "":
             raise ValueError("job_url must not be empty or None")
-        conn = get_postgres_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT title, curated_resume FROM jobs WHERE job_url=%s;", (job_url,))
-        row = cur.fetchone()
-        if row is not None:
-            return row[0], row[1]
-        else:
-            return None
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT j.title, r.curated_resume FROM job_resume_results r JOIN jobs j ON j.job_url = r.job_url
+                WHERE r.job_url = %s AND r.resume_id = %s;
+                """,
+                (job_url, resume_id)
+            )
+            row = cur.fetchone()
+            if row is not None:
+                return row[0], row[1]
+            else:
+                return None
     except Exception as e:
         print(f"Error retrieving jobs from postgres: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+
+def get_collection_chunks(collection_name: str, page_size: int = RESUME_CHUNK_PAGE_SIZE):
+    """
+    Read every chunk of a vectorstore collection straight from langchain_pg_embedding in document order.
+    No embedding call or distance sort is needed. Rows are paged with a keyset on (position, uuid)
+    so large documents are not truncated.
+
+    Args:
+        collection_name (str): Name of the langchain_pg_collection to read.
+        page_size (int): Number of rows fetched per query.
+
+    Yields:
+        tuple: (document, metadata) for each chunk, ordered by the 'position' metadata set at upload.
+               Chunks stored without a position come last.
+    """
+    last_position, last_uuid = None, None
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT to_regclass('public.langchain_pg_embedding');")
+            if cur.fetchone()[0] is None:
+                return
+            while True:
+                cur.execute(
+                    """
+                    SELECT e.document, e.cmetadata,
+                           COALESCE((e.cmetadata->>'position')::int, 2147483647) AS position,
+                           e.uuid::text
+                    FROM langchain_pg_embedding e
+                    JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+                    WHERE c.name = %s
+                      AND (%s IS NULL OR (COALESCE((e.cmetadata->>'position')::int, 2147483647), e.uuid) > (%s, %s::uuid))
+                    ORDER BY position, e.uuid
+                    LIMIT %s;
+                    """,
+                    (collection_name, last_position, last_position, last_uuid, page_size)
+                )
+                rows = cur.fetchall()
+                for row in rows:
+                    yield row[0], row[1] or {}
+                if len(rows) < page_size:
+                    break
+                last_position, last_uuid = rows[-1][2], rows[-1][3]
+    except Exception as e:
+        print(f"Error retrieving collection chunks from postgres: {e}")
+        raise
+
+def get_cached_embeddings(model: str, content_hashes: list[str]) -> dict:
+    """
+    Look up previously computed embeddings by content hash.
+
+    Args:
+        model (str): Embedding model name the vectors were produced with.
+        content_hashes (list): Content hashes to look up.
+
+    Returns:
+        dict: Maps each cached content_hash to its embedding (list of floats).
+    """
+    if not content_hashes:
+        return {}
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT content_hash, embedding FROM embedding_cache WHERE model = %s AND content_hash = ANY(%s);",
+                (model, list(content_hashes))
+            )
+            return {row[0]: list(row[1]) for row in cur.fetchall()}
+    except Exception as e:
+        print(f"Error retrieving cached embeddings from postgres: {e}")
+        raise
+
+def save_cached_embeddings(model: str, embeddings: dict):
+    """
+    Store embeddings keyed by (model, content_hash). Existing entries are left untouched.
+
+    Args:
+        model (str): Embedding model name the vectors were produced with.
+        embeddings (dict): Maps content_hash to embedding (list of floats).
+    """
+    if not embeddings:
+        return
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            execute_values(
+                cur,
+                """
+                INSERT INTO embedding_cache (model, content_hash, embedding)
+                VALUES %s
+                ON CONFLICT (model, content_hash) DO NOTHING;
+                """,
+                [(model, content_hash, list(embedding)) for content_hash, embedding in embeddings.items()]
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error saving cached embeddings to postgres: {e}")
+        raise
+
+def create_resume_version(resume_id: str, filename: str = ""):
+    """
+    Reserve the next version number for a resume. The version starts inactive until activate_resume_version swaps it in.
+
+    Args:
+        resume_id (str): Identifier of the candidate resume.
+        filename (str): Name of the uploaded file.
+
+    Returns:
+        tuple: (version, collection_name) for the new version.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            # Serialize version allocation per resume so concurrent uploads get distinct numbers
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (resume_id,))
+            cur.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM resume_versions WHERE resume_id = %s;", (resume_id,))
+            version = cur.fetchone()[0]
+            collection_name = f"resume_{resume_id}_v{version}"
+            cur.execute(
+                "INSERT INTO resume_versions (resume_id, version, collection_name, filename) VALUES (%s, %s, %s, %s);",
+                (resume_id, version, collection_name, filename)
+            )
+            conn.commit()
+            return version, collection_name
+    except Exception as e:
+        print(f"Error creating resume version in postgres: {e}")
+        raise
+
+def activate_resume_version(resume_id: str, version: int) -> bool:
+    """
+    Atomically make a resume version the active one. Readers see either the old or the new version, never neither.
+    A version older than the active one is left inactive, so of concurrent uploads the newest always wins.
+
+    Returns:
+        bool: True if the version is now active, False if a newer version was already active.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            # Serialize activations per resume so the check below sees the latest active version
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (resume_id,))
+            cur.execute("SELECT version FROM resume_versions WHERE resume_id = %s AND is_active;", (resume_id,))
+            active = cur.fetchone()
+            if active is not None and active[0] > version:
+                conn.rollback()
+                return False
+            cur.execute(
+                "UPDATE resume_versions SET is_active = FALSE WHERE resume_id = %s AND is_active AND version <> %s;",
+                (resume_id, version)
+            )
+            cur.execute(
+                "UPDATE resume_versions SET is_active = TRUE WHERE resume_id = %s AND version = %s;",
+                (resume_id, version)
+            )
+            if cur.rowcount != 1:
+                raise ValueError(f"Resume version {resume_id} v{version} does not exist")
+            conn.commit()
+            return True
+    except Exception as e:
+        print(f"Error activating resume version in postgres: {e}")
+        raise
+
+def get_active_resume_version(resume_id: str):
+    """
+    Return the active version of a resume.
+
+    Returns:
+        tuple or None: (version, collection_name), or None if the resume has no active version.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT to_regclass('public.resume_versions');")
+            if cur.fetchone()[0] is None:
+                return None
+            cur.execute(
+                "SELECT version, collection_name FROM resume_versions WHERE resume_id = %s AND is_active;",
+                (resume_id,)
+            )
+            row = cur.fetchone()
+            return (row[0], row[1]) if row is not None else None
+    except Exception as e:
+        print(f"Error retrieving active resume version from postgres: {e}")
+        raise
+
+def get_resume_versions(resume_id: str = None):
+    """
+    List stored resume versions, newest first.
+
+    Args:
+        resume_id (str, optional): Only list versions of this resume.
+
+    Returns:
+        list: List of dicts with resume_id, version, filename, is_active and created_at.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT resume_id, version, filename, is_active, created_at FROM resume_versions
+                WHERE %s IS NULL OR resume_id = %s
+                ORDER BY resume_id, version DESC;
+                """,
+                (resume_id, resume_id)
+            )
+            rows = cur.fetchall()
+            versions = []
+            for row in rows:
+                versions.append({
+                    "resume_id": row[0],
+                    "version": row[1],
+                    "filename": row[2],
+                    "is_active": row[3],
+                    "created_at": row[4].isoformat() if row[4] else None
+                })
+            return versions
+    except Exception as e:
+        print(f"Error retrieving resume versions from postgres: {e}")
+        raise
+
+def delete_old_resume_versions(resume_id: str, keep: int = 1):
+    """
+    Garbage collect old resume versions and their vectorstore collections.
+    The active version and the newest `keep` inactive versions are kept.
+
+    Returns:
+        int: Number of versions deleted.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT version, collection_name FROM resume_versions
+                WHERE resume_id = %s AND NOT is_active
+                ORDER BY version DESC
+                OFFSET %s;
+                """,
+                (resume_id, max(0, keep))
+            )
+            stale = cur.fetchall()
+            for version, collection_name in stale:
+                delete_collection(cur, collection_name)
+                cur.execute("DELETE FROM resume_versions WHERE resume_id = %s AND version = %s;", (resume_id, version))
+            conn.commit()
+            return len(stale)
+    except Exception as e:
+        print(f"Error deleting resume versions from postgres: {e}")
+        raise
+
+def delete_resume_version(resume_id: str, version: int):
+    """
+    Delete a single inactive resume version, for example after a failed upload.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "DELETE FROM resume_versions WHERE resume_id = %s AND version = %s AND NOT is_active RETURNING collection_name;",
+                (resume_id, version)
+            )
+            row = cur.fetchone()
+            if row is not None:
+                delete_collection(cur, row[0])
+            conn.commit()
+    except Exception as e:
+        print(f"Error deleting resume version from postgres: {e}")
+        raise
+
+def delete_collection(cur, collection_name: str):
+    """
+    Delete a vectorstore collection and its embeddings using the caller's cursor and transaction.
+    """
+    cur.execute("SELECT to_regclass('public.langchain_pg_collection');")
+    if cur.fetchone()[0] is None:
+        return
+    cur.execute(
+        """
+        DELETE FROM langchain_pg_embedding
+        WHERE collection_id IN (SELECT uuid FROM langchain_pg_collection WHERE name = %s);
+        """,
+        (collection_name,)
+    )
+    cur.execute("DELETE FROM langchain_pg_collection WHERE name = %s;", (collection_name,))
+
+AUTOMATE_RUN_FIELDS = ("status", "last_step", "state", "progress", "error")
+
+def create_automate_run(run_id: str, params: dict, status: str = "pending", queued: bool = False):
+    """
+    Record a new automate run with the parameters needed to resume it.
+    queued marks runs executed by the background queue, which are requeued after a restart.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO automate_runs (run_id, status, params, queued) VALUES (%s, %s, %s, %s);",
+                (run_id, status, Json(params), queued)
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error creating automate run in postgres: {e}")
+        raise
+
+def get_automate_run(run_id: str):
+    """
+    Retrieve an automate run.
+
+    Returns:
+        dict or None: The run's status, params, last completed step, saved state, progress, error, queued flag and attempts.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT run_id, status, params, last_step, state, progress, error, created_at, updated_at, queued, attempts
+                FROM automate_runs WHERE run_id = %s;
+                """,
+                (run_id,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return {
+                "run_id": row[0],
+                "status": row[1],
+                "params": row[2],
+                "last_step": row[3],
+                "state": row[4] or {},
+                "progress": row[5] or {},
+                "error": row[6],
+                "created_at": row[7].isoformat() if row[7] else None,
+                "updated_at": row[8].isoformat() if row[8] else None,
+                "queued": row[9],
+                "attempts": row[10]
+            }
+    except Exception as e:
+        print(f"Error retrieving automate run from postgres: {e}")
+        raise
+
+def list_automate_runs(status: str = None, limit: int = 50):
+    """
+    List automate runs, newest first.
+
+    Args:
+        status (str, optional): Only list runs with this status.
+        limit (int): Maximum number of runs to return.
+
+    Returns:
+        list: List of run dicts with run_id, status, params, last_step, progress, error, timestamps, queued flag and attempts.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT run_id, status, params, last_step, progress, error, created_at, updated_at, queued, attempts
+                FROM automate_runs
+                WHERE %s IS NULL OR status = %s
+                ORDER BY created_at DESC
+                LIMIT %s;
+                """,
+                (status, status, limit)
+            )
+            rows = cur.fetchall()
+            runs = []
+            for row in rows:
+                runs.append({
+                    "run_id": row[0],
+                    "status": row[1],
+                    "params": row[2],
+                    "last_step": row[3],
+                    "progress": row[4] or {},
+                    "error": row[5],
+                    "created_at": row[6].isoformat() if row[6] else None,
+                    "updated_at": row[7].isoformat() if row[7] else None,
+                    "queued": row[8],
+                    "attempts": row[9]
+                })
+            return runs
+    except Exception as e:
+        print(f"Error retrieving automate runs from postgres: {e}")
+        raise
+
+def update_automate_run(run_id: str, **fields):
+    """
+    Update an automate run. Only the fields passed are changed; state and progress are merged into the stored JSON.
+
+    Args:
+        run_id (str): The run to update.
+        **fields: Any of status, last_step, state, progress and error.
+    """
+    unknown = set(fields) - set(AUTOMATE_RUN_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown automate run fields: {', '.join(sorted(unknown))}")
+    assignments = []
+    values = []
+    for field, value in fields.items():
+        if field in ("state", "progress"):
+            assignments.append(f"{field} = COALESCE({field}, '{{}}'::jsonb) || %s")
+            values.append(Json(value or {}))
+        else:
+            assignments.append(f"{field} = %s")
+            values.append(value)
+    assignments.append("updated_at = now()")
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"UPDATE automate_runs SET {', '.join(assignments)} WHERE run_id = %s;",
+                (*values, run_id)
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error updating automate run in postgres: {e}")
+        raise
+
+def start_automate_run(run_id: str) -> int:
+    """
+    Mark an automate run as running and count the attempt.
+
+    Returns:
+        int: Number of times the run has been started, including this one.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE automate_runs SET status = 'running', error = NULL, attempts = COALESCE(attempts, 0) + 1, updated_at = now()
+                WHERE run_id = %s
+                RETURNING attempts;
+                """,
+                (run_id,)
+            )
+            row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else 0
+    except Exception as e:
+        print(f"Error starting automate run in postgres: {e}")
+        raise
+
+def finish_automate_run(run_id: str, status: str, error: str = None) -> bool:
+    """
+    Record the final status of an automate run unless it was cancelled while it ran.
+
+    Returns:
+        bool: True if the status was recorded, False if the run was cancelled.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE automate_runs SET status = %s, error = %s, updated_at = now()
+                WHERE run_id = %s AND status <> 'cancelled';
+                """,
+                (status, error, run_id)
+            )
+            conn.commit()
+            return cur.rowcount > 0
+    except Exception as e:
+        print(f"Error finishing automate run in postgres: {e}")
+        raise
+
+def get_llm_cache_response(cache_key: str, ttl_seconds: float):
+    """
+    Look up a cached LLM response that is younger than ttl_seconds and record the hit.
+
+    Returns:
+        str or None: The cached response content, or None on a miss.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                UPDATE llm_response_cache
+                SET hits = hits + 1, last_hit_at = now()
+                WHERE cache_key = %s AND created_at > now() - make_interval(secs => %s)
+                RETURNING response;
+                """,
+                (cache_key, ttl_seconds)
+            )
+            row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else None
+    except Exception as e:
+        print(f"Error retrieving cached LLM response from postgres: {e}")
+        raise
+
+def save_llm_cache_response(cache_key: str, model: str, response: str):
+    """Store an LLM response, replacing an expired entry with the same key."""
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO llm_response_cache (cache_key, model, response)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET response = EXCLUDED.response, hits = 0, created_at = now(), last_hit_at = now();
+                """,
+                (cache_key, model, response)
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error saving LLM response to postgres: {e}")
+        raise
+
+def evict_llm_cache(ttl_seconds: float, max_entries: int) -> int:
+    """
+    Delete expired LLM responses and, beyond max_entries, the least recently used ones.
+
+    Returns:
+        int: Number of entries deleted.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "DELETE FROM llm_response_cache WHERE created_at <= now() - make_interval(secs => %s);",
+                (ttl_seconds,)
+            )
+            deleted = cur.rowcount
+            cur.execute(
+                """
+                DELETE FROM llm_response_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM llm_response_cache
+                    ORDER BY last_hit_at DESC
+                    OFFSET %s
+                );
+                """,
+                (max_entries,)
+            )
+            deleted += cur.rowcount
+            conn.commit()
+            return deleted
+    except Exception as e:
+        print(f"Error evicting LLM responses from postgres: {e}")
+        raise
+
+def get_jobs_to_embed(limit: int = 100):
+    """
+    Retrieve jobs whose description has no embedding yet or changed since it was embedded.
+
+    Returns:
+        list: (job_url, description) tuples.
+    """
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT job_url, description FROM jobs
+                WHERE description IS NOT NULL AND description <> ''
+                  AND embedding_hash IS DISTINCT FROM md5(description)
+                LIMIT %s;
+                """,
+                (limit,)
+            )
+            return cur.fetchall()
+    except Exception as e:
+        print(f"Error retrieving jobs to embed from postgres: {e}")
+        raise
+
+def save_job_embeddings(embeddings: list):
+    """
+    Store description embeddings on the jobs table.
+
+    Args:
+        embeddings (list): (job_url, embedding, embedding_hash) tuples, where embedding_hash is md5 of the embedded description.
+    """
+    if not embeddings:
+        return
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            execute_values(
+                cur,
+                """
+                UPDATE jobs AS j
+                SET description_embedding = v.embedding::vector, embedding_hash = v.embedding_hash
+                FROM (VALUES %s) AS v (job_url, embedding, embedding_hash)
+                WHERE j.job_url = v.job_url;
+                """,
+                [(job_url, str(list(embedding)), embedding_hash) for job_url, embedding, embedding_hash in embeddings]
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error saving job embeddings to postgres: {e}")
+        raise
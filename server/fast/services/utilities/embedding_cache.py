@@ -0,0 +1,64 @@
+from langchain_core.embeddings import Embeddings
+from services.utilities.database_util import get_cached_embeddings, save_cached_embeddings
+import hashlib
+import threading
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedder with a persistent postgres cache keyed by (model name, content hash).
+    Only texts that have not been embedded before are sent to the underlying embedder.
+    """
+    def __init__(self, embedder: Embeddings, model: str):
+        self.embedder = embedder
+        self.model = model
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [self.content_hash(text) for text in texts]
+        try:
+            cached = get_cached_embeddings(self.model, list(set(hashes)))
+        except Exception as e:
+            # The cache is an optimization; fall back to embedding everything
+            print(f"Embedding cache lookup failed: {e}")
+            self._count("errors")
+            cached = {}
+
+        missing = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in cached:
+                missing[content_hash] = text
+        self._count("hits", len(set(hashes)) - len(missing))
+        self._count("misses", len(missing))
+
+        if missing:
+            print(f"Embedding {len(missing)} of {len(set(hashes))} chunks, the rest are cached.")
+            new_embeddings = dict(zip(missing.keys(), self.embedder.embed_documents(list(missing.values()))))
+            try:
+                save_cached_embeddings(self.model, new_embeddings)
+            except Exception as e:
+                print(f"Embedding cache save failed: {e}")
+                self._count("errors")
+            cached.update(new_embeddings)
+
+        return [cached[content_hash] for content_hash in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embedder.embed_query(text)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters for the embedding cache."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,126 @@
+import json
+import re
+
+THINK_BLOCK = re.compile(r"<think>.*?(</think>|$)", re.DOTALL)
+CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+CLOSERS = {"{": "}", "[": "]"}
+
+
+def extract_json(text: str, expected_type: type = dict):
+    """
+    Extract the first JSON value of expected_type (dict or list) from an LLM response.
+    Tolerates reasoning blocks, markdown code fences, text around the JSON, smart quotes,
+    trailing commas, raw newlines inside strings and output truncated before the closing brackets.
+
+    Raises:
+        ValueError: If no JSON value of the expected type can be recovered.
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("Empty LLM response")
+    text = THINK_BLOCK.sub("", text)
+    opener = "{" if expected_type is dict else "["
+    candidates = [match.group(1) for match in CODE_FENCE.finditer(text)] + [text]
+    for candidate in candidates:
+        start = candidate.find(opener)
+        while start != -1:
+            value = _parse_from(candidate, start)
+            if isinstance(value, expected_type):
+                return value
+            start = candidate.find(opener, start + 1)
+    raise ValueError(f"No JSON {expected_type.__name__} found in LLM response")
+
+
+def _parse_from(text: str, start: int):
+    """Parse the JSON value starting at text[start], repairing it if the plain parse fails."""
+    end, closers = _find_json_end(text, start)
+    raw = text[start:end] + closers
+    for attempt in (raw, TRAILING_COMMA.sub(r"\1", raw.translate(SMART_QUOTES))):
+        try:
+            return json.loads(attempt, strict=False)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def _find_json_end(text: str, start: int):
+    """
+    Return the end of the bracketed value starting at text[start] and the closing characters
+    needed if the text ends before the value is complete.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+            if not stack:
+                return index + 1, ""
+    return len(text), ('"' if in_string else "") + "".join(reversed(stack))
+
+
+def parse_job_score(text: str) -> dict:
+    """
+    Parse and validate a job score response.
+
+    Returns:
+        dict: {"score": int between 0 and 100, "content": str}
+
+    Raises:
+        ValueError: If the response has no usable score.
+    """
+    return validate_job_score(extract_json(text, dict))
+
+
+def parse_job_scores(text: str, job_ids: list[str]) -> dict:
+    """
+    Parse a batched job score response and map its entries back to the jobs that were sent.
+    Jobs are labelled with short job_ids in the prompt, because models often mangle long job URLs when copying them.
+    Entries with an unknown job_id or no usable score are dropped; the caller rescores the missing jobs.
+
+    Returns:
+        dict: Maps job_id to {"score", "content"} for every job with a valid entry.
+    """
+    expected = set(job_ids)
+    scores = {}
+    for entry in extract_json(text, list):
+        if not isinstance(entry, dict):
+            continue
+        job_id = str(entry.get("job_id", "")).strip().lstrip("#")
+        if job_id.endswith(".0"):
+            job_id = job_id[:-2]
+        if job_id not in expected or job_id in scores:
+            continue
+        try:
+            scores[job_id] = validate_job_score(entry)
+        except ValueError as e:
+            print(f"Dropping batched score for job {job_id}: {e}")
+    return scores
+
+
+def validate_job_score(data: dict) -> dict:
+    """Validate a parsed {score, content} object, clamping the score to 0-100."""
+    score = data.get("score")
+    if isinstance(score, str):
+        score = score.strip().rstrip("%")
+    try:
+        score = int(round(float(score)))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid score in LLM response: {data.get('score')!r}")
+    content = data.get("content") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return {"score": min(100, max(0, score)), "content": content}
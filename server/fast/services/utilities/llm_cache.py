@@ -0,0 +1,90 @@
+from langchain_core.prompt_values import PromptValue
+from services.utilities.database_util import get_llm_cache_response, save_llm_cache_response, evict_llm_cache
+import hashlib
+import json
+import os
+import threading
+
+# Cached responses older than this are ignored and eventually deleted
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Entries kept after eviction, least recently used are deleted first
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Eviction runs after every this many saves
+LLM_CACHE_EVICT_EVERY = int(os.environ.get("LLM_CACHE_EVICT_EVERY", "100"))
+
+
+class LLMResponseCache:
+    """
+    Persistent postgres cache for LLM responses keyed by a hash of model, client parameters and rendered prompt.
+    Lookups and saves never fail the LLM call; errors are counted and treated as misses.
+    """
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES, evict_every: int = LLM_CACHE_EVICT_EVERY):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.evict_every = max(1, evict_every)
+        self._lock = threading.Lock()
+        self._saves = 0
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "errors": 0, "evicted": 0}
+
+    @staticmethod
+    def render_prompt(prompt) -> str:
+        """Render a string, prompt value or list of messages to a stable string."""
+        if isinstance(prompt, PromptValue):
+            prompt = prompt.to_messages()
+        if isinstance(prompt, str):
+            return prompt
+        return json.dumps(
+            [[getattr(message, "type", None), getattr(message, "content", message)] for message in prompt],
+            default=str
+        )
+
+    def cache_key(self, model: str, params: dict, prompt) -> str:
+        key = json.dumps({"model": model, "params": params, "prompt": self.render_prompt(prompt)}, sort_keys=True, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str):
+        """Return the cached response content, or None on a miss."""
+        try:
+            response = get_llm_cache_response(cache_key, self.ttl)
+        except Exception as e:
+            print(f"LLM cache lookup failed: {e}")
+            self._count("errors")
+            return None
+        self._count("hits" if response is not None else "misses")
+        return response
+
+    def set(self, cache_key: str, model: str, response: str):
+        try:
+            save_llm_cache_response(cache_key, model, response)
+        except Exception as e:
+            print(f"LLM cache save failed: {e}")
+            self._count("errors")
+            return
+        with self._lock:
+            self._saves += 1
+            evict = self._saves % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Delete expired entries and trim the cache to max_entries."""
+        try:
+            self._count("evicted", evict_llm_cache(self.ttl, self.max_entries))
+        except Exception as e:
+            print(f"LLM cache eviction failed: {e}")
+            self._count("errors")
+
+    def bypass(self):
+        self._count("bypassed")
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters for the LLM response cache."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,308 @@
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
+from langchain_core.messages import AIMessage
+from services.utilities.llm_cache import LLMResponseCache
+import asyncio
+import collections
+import os
+import random
+import re
+import threading
+import time
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "nvidia/llama-3.3-nemotron-super-49b-v1")
+# Maximum LLM calls in flight across the whole process
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF = float(os.environ.get("LLM_BACKOFF", "1.0"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "30"))
+
+# Client parameters per task. The model defaults to LLM_MODEL and can be overridden per task
+# with LLM_MODEL_<TASK>, for example LLM_MODEL_SCORING.
+LLM_TASKS = {
+    "chat": {"streaming": True},
+    "orchestrator": {},
+    "scoring": {"max_tokens": 4096},
+    "curation": {"temperature": 0.7, "max_tokens": 2048},
+    "doc_split": {"streaming": False, "max_tokens": 4096},
+}
+# Tasks whose invoke/ainvoke responses are cached by default; call sites can still pass cache=False
+LLM_CACHE_TASKS = [task.strip() for task in os.environ.get("LLM_CACHE_TASKS", "scoring,doc_split,curation").split(",") if task.strip()]
+
+RETRYABLE_STATUS = re.compile(r"\b(429|5\d\d)\b")
+
+
+class SlotLimiter:
+    """
+    Limit on calls in flight shared by threads and event loops.
+    A freed slot is handed directly to the longest waiting caller, so waiters are served in arrival order.
+    """
+    def __init__(self, slots: int):
+        self._lock = threading.Lock()
+        self._free = slots
+        # threading.Event for threads, asyncio.Future for coroutines
+        self._waiters = collections.deque()
+
+    def acquire(self):
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            future = loop.create_future()
+            self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = future in self._waiters
+                if waiting:
+                    self._waiters.remove(future)
+            # A slot handed over before the cancellation belongs to this caller; a cancelled future returns it in _grant
+            if not waiting and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                try:
+                    waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+                    return
+                except RuntimeError:
+                    # The waiter's event loop is closed; pass the slot on
+                    continue
+            self._free += 1
+
+    def _grant(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class LLMGateway:
+    """
+    Single entry point for LLM calls.
+    Reuses one client per task, caps the number of calls in flight
+    across the process and retries throttled (429) or failed (5xx) calls with jittered exponential backoff.
+    Plain invoke/ainvoke calls for tasks in LLM_CACHE_TASKS are answered from the persistent response cache when possible.
+    """
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES, backoff: float = LLM_BACKOFF, backoff_max: float = LLM_BACKOFF_MAX, cache: LLMResponseCache = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.cache = cache or LLMResponseCache()
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._slots = SlotLimiter(self.max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "timeouts": 0, "in_flight": 0}
+
+    def get_model(self, task: str) -> str:
+        return os.environ.get(f"LLM_MODEL_{task.upper()}", LLM_MODEL)
+
+    def get_llm(self, task: str) -> ChatNVIDIA:
+        """Return the shared client for a task."""
+        if task not in LLM_TASKS:
+            raise ValueError(f"Unknown LLM task '{task}'")
+        client = self._clients.get(task)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(task)
+                if client is None:
+                    client = ChatNVIDIA(model=self.get_model(task), **LLM_TASKS[task])
+                    self._clients[task] = client
+        return client
+
+    def invoke(self, task: str, prompt, runnable=None, cache: bool = None, refresh: bool = False):
+        """
+        Invoke the task's client (or a runnable built on it, such as a tool-bound chain).
+        cache overrides whether the response cache is used and refresh skips the lookup but stores the new response.
+        Responses of custom runnables are never cached.
+        """
+        cache_key = self._cache_key(task, prompt, runnable, cache)
+        if cache_key and not refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return AIMessage(content=cached)
+        response = self._invoke(task, prompt, runnable)
+        if cache_key:
+            self.cache.set(cache_key, self.get_model(task), response.content)
+        return response
+
+    async def ainvoke(self, task: str, prompt, runnable=None, cache: bool = None, refresh: bool = False, timeout: float = None):
+        """
+        Async version of invoke.
+        timeout limits each attempt once it holds a slot, so time spent waiting for a slot never counts against it.
+        Timed out attempts are retried like other transient errors. The client runs its request on an executor thread that
+        cannot be stopped, so a timed out request keeps its slot until it actually ends.
+        """
+        cache_key = self._cache_key(task, prompt, runnable, cache)
+        if cache_key and not refresh:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return AIMessage(content=cached)
+        response = await self._ainvoke(task, prompt, runnable, timeout)
+        if cache_key:
+            await asyncio.to_thread(self.cache.set, cache_key, self.get_model(task), response.content)
+        return response
+
+    def _invoke(self, task: str, prompt, runnable=None):
+        target = runnable or self.get_llm(task)
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                return target.invoke(prompt)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self._release()
+            time.sleep(self._delay(attempt))
+
+    async def _ainvoke(self, task: str, prompt, runnable=None, timeout: float = None):
+        target = runnable or self.get_llm(task)
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire()
+            call = asyncio.ensure_future(target.ainvoke(prompt))
+            try:
+                done, _ = await asyncio.wait({call}, timeout=timeout)
+                if not done:
+                    self._count("timeouts")
+                    raise TimeoutError(f"LLM call timed out after {timeout}s")
+                return call.result()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            finally:
+                if call.done():
+                    self._release()
+                else:
+                    # Abandoned (timed out or cancelled) requests hold their slot until they finish
+                    call.add_done_callback(self._release_abandoned)
+            await asyncio.sleep(self._delay(attempt))
+
+    def _cache_key(self, task: str, prompt, runnable, cache: bool):
+        """Return the response cache key for a call, or None if the call is not cached."""
+        if runnable is not None:
+            return None
+        if cache is None:
+            cache = task in LLM_CACHE_TASKS
+        if not cache:
+            self.cache.bypass()
+            return None
+        params = {key: value for key, value in LLM_TASKS.get(task, {}).items() if key != "streaming"}
+        return self.cache.cache_key(self.get_model(task), params, prompt)
+
+    def stream(self, task: str, prompt):
+        """
+        Stream chunks from the task's client. A call is only retried if it fails before the first chunk,
+        so callers never see duplicated output.
+        """
+        llm = self.get_llm(task)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            self._acquire()
+            try:
+                for chunk in llm.stream(prompt):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self._release()
+            time.sleep(self._delay(attempt))
+
+    async def astream(self, task: str, prompt):
+        """Async version of stream."""
+        llm = self.get_llm(task)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            await self._aacquire()
+            try:
+                async for chunk in llm.astream(prompt):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+            finally:
+                self._release()
+            await asyncio.sleep(self._delay(attempt))
+
+    def get_stats(self) -> dict:
+        """Return call, retry, failure and timeout counters, the number of calls in flight and response cache counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["max_concurrency"] = self.max_concurrency
+        stats["cache"] = self.cache.get_stats()
+        return stats
+
+    def _acquire(self):
+        self._slots.acquire()
+        self._count("in_flight")
+        self._count("calls")
+
+    async def _aacquire(self):
+        await self._slots.aacquire()
+        self._count("in_flight")
+        self._count("calls")
+
+    def _release(self):
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    def _release_abandoned(self, call: asyncio.Future):
+        # Retrieve the outcome so an abandoned failure is not reported as never retrieved
+        if not call.cancelled():
+            call.exception()
+        self._release()
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt < self.max_retries and self._is_retryable(error):
+            print(f"LLM call failed, retrying ({attempt + 1}/{self.max_retries}): {error}")
+            self._count("retries")
+            return True
+        self._count("failures")
+        return False
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+        if status is not None:
+            status = int(status)
+            return status == 429 or 500 <= status < 600
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        name = type(error).__name__
+        if "Timeout" in name or "Connection" in name:
+            return True
+        return bool(RETRYABLE_STATUS.search(str(error)))
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter keeps parallel callers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,207 @@
+import psycopg2
+from psycopg2 import pool
+from services.utilities.postgres_pool import get_postgres_connection
+from services.utilities.database_util import JOBS_TO_CURATE_QUERY, JOBS_TABLE_QUERY
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+# Session advisory lock key, so concurrent servers never apply migrations at the same time
+MIGRATION_LOCK_ID = 727710425
+# Attempts to reach postgres on startup before giving up, one second apart
+MIGRATION_CONNECT_ATTEMPTS = int(os.environ.get("MIGRATION_CONNECT_ATTEMPTS", "30"))
+# Estimated rows from which the planner is expected to pick a hot query's index over a sequential scan
+PLAN_CHECK_MIN_ROWS = int(os.environ.get("PLAN_CHECK_MIN_ROWS", "10000"))
+
+# Hot queries, the table each one reads and the index it is expected to use
+HOT_QUERIES = {
+    "jobs_to_curate": (JOBS_TO_CURATE_QUERY, ("default", 60), "job_resume_results", "job_resume_results_uncurated_score_idx"),
+    "jobs_table": (JOBS_TABLE_QUERY, ("default", 10), "job_resume_results", "job_resume_results_score_desc_idx"),
+}
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> list[tuple]:
+    """
+    Read the migration files, named <version>_<name>.sql, in version order.
+
+    Returns:
+        list: (version, name, sql) tuples.
+    """
+    migrations = {}
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE.match(path.name)
+        if not match:
+            raise ValueError(f"Migration file {path.name} does not match <version>_<name>.sql")
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {path.name}")
+        migrations[version] = (version, match.group(2), path.read_text(encoding="utf-8"))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def run_migrations(directory: Path = MIGRATIONS_DIR, connect_attempts: int = MIGRATION_CONNECT_ATTEMPTS) -> list[int]:
+    """
+    Apply the migrations that are not recorded in schema_migrations, each in its own transaction.
+    Migrations are written to be idempotent, so databases created by db/init-db.sql are brought up to date safely.
+
+    Returns:
+        list: Versions applied by this call.
+    """
+    migrations = load_migrations(directory)
+    for attempt in range(1, connect_attempts + 1):
+        try:
+            with get_postgres_connection() as conn:
+                return apply_migrations(conn, migrations)
+        except (psycopg2.OperationalError, pool.PoolError) as e:
+            if attempt >= connect_attempts:
+                raise
+            print(f"Waiting for postgres to apply migrations ({attempt}/{connect_attempts}): {e}")
+            time.sleep(1)
+
+
+def apply_migrations(conn, migrations: list[tuple]) -> list[int]:
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+    try:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMPTZ DEFAULT now()
+            );
+            """
+        )
+        conn.commit()
+        cur.execute("SELECT version, checksum FROM schema_migrations;")
+        applied = dict(cur.fetchall())
+
+        # Refuse to run on drift, so the schema never silently differs from what the migration files describe
+        changed = [
+            f"{version} {name}" for version, name, sql in migrations
+            if version in applied and applied[version] != hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        ]
+        if changed:
+            raise ValueError(f"Migrations changed after they were applied: {', '.join(changed)}; add a new migration instead.")
+
+        applied_now = []
+        for version, name, sql in migrations:
+            checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+            if version in applied:
+                continue
+            print(f"Applying migration {version} {name}")
+            try:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);",
+                    (version, name, checksum)
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Migration {version} {name} failed: {e}")
+                raise
+            applied_now.append(version)
+        print(f"Database schema at version {max([version for version, _, _ in migrations], default=0)}, applied {len(applied_now)} migrations.")
+        return applied_now
+    finally:
+        conn.rollback()
+        cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+
+def get_applied_migrations() -> list[dict]:
+    """Return the migrations recorded in schema_migrations."""
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version;")
+            return [{"version": row[0], "name": row[1], "applied_at": row[2].isoformat()} for row in cur.fetchall()]
+    except Exception as e:
+        print(f"Error retrieving schema migrations from postgres: {e}")
+        raise
+
+
+def check_query_plans(min_rows: int = PLAN_CHECK_MIN_ROWS) -> list[dict]:
+    """
+    EXPLAIN the hot jobs queries and report whether each uses its expected index.
+    Each query is explained under the normal planner settings and again with sequential scans disabled.
+    Small tables are scanned sequentially on purpose, so a query only has to use its index under normal settings
+    once its table holds at least min_rows estimated rows; below that, the index only has to be usable.
+
+    Returns:
+        list: {"query", "expected_index", "rows", "index_expected", "indexes", "forced_indexes", "ok", "plan",
+               "forced_plan"} for each hot query.
+    """
+    results = []
+    try:
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            for name, (query, params, table, expected_index) in HOT_QUERIES.items():
+                # reltuples is -1 for tables that were never vacuumed or analyzed
+                cur.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass;", (table,))
+                rows = cur.fetchone()[0]
+                cur.execute("SET LOCAL enable_seqscan = on;")
+                plan = explain_query(cur, query, params)
+                cur.execute("SET LOCAL enable_seqscan = off;")
+                forced_plan = explain_query(cur, query, params)
+                indexes = sorted(find_plan_indexes(plan))
+                forced_indexes = sorted(find_plan_indexes(forced_plan))
+                index_expected = rows >= min_rows
+                results.append({
+                    "query": name,
+                    "expected_index": expected_index,
+                    "rows": rows,
+                    "index_expected": index_expected,
+                    "indexes": indexes,
+                    "forced_indexes": forced_indexes,
+                    "ok": expected_index in (indexes if index_expected else forced_indexes),
+                    "plan": plan,
+                    "forced_plan": forced_plan
+                })
+            conn.rollback()
+        return results
+    except Exception as e:
+        print(f"Error checking query plans in postgres: {e}")
+        raise
+
+
+def explain_query(cur, query: str, params: tuple) -> dict:
+    """Return the top plan node of EXPLAIN (FORMAT JSON) for a query."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def find_plan_indexes(plan: dict) -> set:
+    """Collect the index names used anywhere in an EXPLAIN (FORMAT JSON) plan node."""
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        indexes |= find_plan_indexes(child)
+    return indexes
+
+
+if __name__ == "__main__":
+    # python -m services.utilities.migrations [--check]
+    applied = run_migrations()
+    print(f"Applied migrations: {applied}")
+    if "--check" in sys.argv[1:]:
+        failed = False
+        for result in check_query_plans():
+            print(
+                f"{result['query']}: expected {result['expected_index']} ({result['rows']} rows, "
+                f"{'required' if result['index_expected'] else 'usable only'}), "
+                f"used {result['indexes'] or 'no index'}, with seqscan off {result['forced_indexes'] or 'no index'} "
+                f"-> {'ok' if result['ok'] else 'FAILED'}"
+            )
+            failed = failed or not result["ok"]
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,123 @@
+import psycopg2
+from psycopg2 import pool
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+POSTGRES_POOL_MIN = int(os.environ.get("POSTGRES_POOL_MIN", "1"))
+POSTGRES_POOL_MAX = int(os.environ.get("POSTGRES_POOL_MAX", "10"))
+# Connections idle for longer than this are pinged before being handed out
+POSTGRES_POOL_PING_INTERVAL = float(os.environ.get("POSTGRES_POOL_PING_INTERVAL", "30"))
+# Seconds to wait for a free connection before giving up
+POSTGRES_POOL_TIMEOUT = float(os.environ.get("POSTGRES_POOL_TIMEOUT", "30"))
+
+
+class PostgresPool:
+    """
+    Process-wide psycopg2 connection pool.
+    Blocks while all connections are checked out, pings connections that have been idle and
+    replaces connections that are broken instead of handing them out again.
+    """
+    def __init__(self, minconn: int = POSTGRES_POOL_MIN, maxconn: int = POSTGRES_POOL_MAX):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._last_used = {}
+
+    def _get_pool(self):
+        if self._pool is None or self._pool.closed:
+            with self._lock:
+                if self._pool is None or self._pool.closed:
+                    self._pool = pool.ThreadedConnectionPool(
+                        self.minconn,
+                        self.maxconn,
+                        dbname=os.environ.get("POSTGRES_DB", "resume_agent"),
+                        user=os.environ.get("POSTGRES_USER", "vector_admin"),
+                        password=os.environ.get("POSTGRES_PASSWORD", "Resume_Pass"),
+                        host=os.environ.get("POSTGRES_HOST", "pgvector-db"),
+                        port=int(os.environ.get("POSTGRES_PORT", "5432"))
+                    )
+                    self._last_used = {}
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < POSTGRES_POOL_PING_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=POSTGRES_POOL_TIMEOUT):
+            raise pool.PoolError(f"No postgres connection available after {POSTGRES_POOL_TIMEOUT}s")
+        try:
+            connection_pool = self._get_pool()
+            # Every idle connection may have been dropped by the server, so allow one retry per pooled connection
+            for _ in range(self.maxconn):
+                conn = connection_pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                print("Discarding broken postgres connection and reconnecting.")
+                self._last_used.pop(id(conn), None)
+                connection_pool.putconn(conn, close=True)
+            return connection_pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            connection_pool = self._get_pool()
+            if not close and not conn.closed:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._last_used[id(conn)] = time.monotonic()
+            else:
+                self._last_used.pop(id(conn), None)
+            connection_pool.putconn(conn, close=close or bool(conn.closed))
+        except psycopg2.Error:
+            self._last_used.pop(id(conn), None)
+            self._get_pool().putconn(conn, close=True)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+            self._last_used = {}
+
+
+postgres_pool = PostgresPool()
+
+
+@contextmanager
+def get_postgres_connection():
+    """
+    Borrow a connection from the process-wide pool and return it when the block exits.
+    Any open transaction is rolled back on return; connections that failed at the
+    network level are closed so the pool reconnects on the next checkout.
+    """
+    try:
+        conn = postgres_pool.getconn()
+    except Exception as e:
+        print(f"Error connecting to postgres: {e}")
+        raise
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        postgres_pool.putconn(conn, close=broken)
@@ -1,6 +1,7 @@
 from mcp.server.fastmcp import FastMCP
 from services import job_scraper_service
 from pydantic import BaseModel, Field
+import asyncio
 
 # Create the MCP server
 mcp = FastMCP(
@@ -16,28 +17,37 @@ class job_scraper_request(BaseModel):
     results_wanted: int = Field(default=10, description="Number of job results to return")
     hours_old: int = Field(default=24, description="Maximum age of job postings in hours")
     country_indeed: str = Field(default="USA", description="Country for Indeed job search")
+    search_terms: list[str] = Field(default=[], description="Job titles to search for; overrides search_term when not empty")
+    locations: list[str] = Field(default=[], description="Locations to search in; overrides location when not empty")
+    sites: list[str] = Field(default=["indeed"], description="Job boards to search: indeed, linkedin, zip_recruiter, glassdoor, google, bayt or naukri")
 
 @mcp.tool()
-def job_scraper_get_jobs(request: job_scraper_request = None) -> str:
+async def job_scraper_get_jobs(request: job_scraper_request = None) -> dict:
     """
     Get a list of jobs from online job boards.
+    Every combination of sites, search terms and locations is scraped in parallel and the jobs are de-duplicated by job_url.
 
     Args:
       request (job_scraper_request): The request containing information needed to get the job list
 
     Returns:
-      str: list of jobs in a json format
+      dict: "jobs" with the list of jobs and "sites" with per-site scrape counts and timing
     """
+    # Scraping blocks, so run it off the event loop to keep serving other requests
     if request is None:
         # Call get_jobs with no parameters to use all defaults
-        return job_scraper_service.get_jobs()
+        return await asyncio.to_thread(job_scraper_service.get_jobs)
     else:
-        return job_scraper_service.get_jobs(
+        return await asyncio.to_thread(
+            job_scraper_service.get_jobs,
             search_term=request.search_term,
             location=request.location,
             results_wanted=request.results_wanted,
             hours_old=request.hours_old,
-            country_indeed=request.country_indeed
+            country_indeed=request.country_indeed,
+            search_terms=request.search_terms,
+            locations=request.locations,
+            sites=request.sites
         )
 
 if __name__ == "__main__":
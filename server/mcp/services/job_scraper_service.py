@@ -1,85 +1,214 @@
 from jobspy import scrape_jobs
 import pandas as pd
-import io
-import psycopg2
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import os
+import threading
+import time
+from psycopg2.extras import execute_values
+from services.utilities.postgres_pool import get_postgres_connection
+from services.utilities.scrape_cache import scrape_cache, scrape_cache_ttl
 
-def get_jobs(search_term: str = "software engineer", location: str = "", results_wanted: int = 10, hours_old: int = 24, country_indeed: str = "USA"):
-    jobs = scrape_jobs(
-        site_name=["indeed"],
-        search_term=search_term,
-        location=location,
-        results_wanted=results_wanted,
-        hours_old=hours_old,
-        country_indeed=country_indeed,
-    )
-
-    csv_buffer = io.StringIO()
-    jobs.to_csv(csv_buffer, index=False) # index=False prevents writing the DataFrame index
-    csv_string = csv_buffer.getvalue()
-    job_df = pd.read_csv(io.StringIO(csv_string))
-    jobs_json = []
-    for _, row in job_df.iterrows():
-        jobs_json.append({
-            "title": str(row.get("title", "")),
-            "company": str(row.get("company", "")),
-            "job_url": str(row.get("job_url", "")),
-        })
-    
-    save_jobs_to_postgres(job_df)
+JOB_UPSERT_PAGE_SIZE = int(os.environ.get("JOB_UPSERT_PAGE_SIZE", "5000"))
+# last_seen of unchanged jobs is only rewritten once it is older than this, so rescrapes do not touch every row
+JOB_LAST_SEEN_RESOLUTION = float(os.environ.get("JOB_LAST_SEEN_RESOLUTION", "3600"))
+# Columns stored in the jobs table, in insert order
+JOB_COLUMNS = ["title", "company", "job_url", "description", "location", "is_remote"]
+SUPPORTED_SITES = ("indeed", "linkedin", "zip_recruiter", "glassdoor", "google", "bayt", "naukri")
+# Scrapes running at the same time per site; SCRAPE_SITE_CONCURRENCY_<SITE> overrides one site
+SCRAPE_SITE_CONCURRENCY = int(os.environ.get("SCRAPE_SITE_CONCURRENCY", "2"))
+
+_site_executors = {}
+_site_executors_lock = threading.Lock()
+
+def get_site_executor(site: str) -> ThreadPoolExecutor:
+    """
+    Return the pool that runs the scrapes of one site, shared by all requests.
+    Each site has its own pool sized to its limit, so scrapes waiting for a busy site never hold workers another site could use.
+    """
+    with _site_executors_lock:
+        if site not in _site_executors:
+            limit = int(os.environ.get(f"SCRAPE_SITE_CONCURRENCY_{site.upper()}", SCRAPE_SITE_CONCURRENCY))
+            _site_executors[site] = ThreadPoolExecutor(max_workers=max(1, limit), thread_name_prefix=f"scrape-{site}")
+        return _site_executors[site]
+
+def scrape_site(site: str, search_term: str, location: str, results_wanted: int, hours_old: int, country_indeed: str):
+    """
+    Scrape one (site, search term, location) combination. Runs on the site's executor, which limits concurrent scrapes per site.
+    Results are reused for a window bounded by hours_old, and identical scrapes in flight are shared.
+
+    Returns:
+        tuple: (jobs DataFrame, cache source "hit", "coalesced" or "miss", start time, finish time)
+    """
+    started = time.monotonic()
+
+    def scrape():
+        return scrape_jobs(
+            site_name=[site],
+            search_term=search_term,
+            location=location,
+            results_wanted=results_wanted,
+            hours_old=hours_old,
+            country_indeed=country_indeed,
+        )
+
+    key = (site, search_term.strip().lower(), location.strip().lower(), results_wanted, hours_old, country_indeed.strip().lower())
+    jobs, source = scrape_cache.get_or_scrape(key, scrape_cache_ttl(hours_old), scrape)
+    return jobs, source, started, time.monotonic()
+
+def scrape_all(sites: list[str], search_terms: list[str], locations: list[str], results_wanted: int, hours_old: int, country_indeed: str):
+    """
+    Scrape every combination of site, search term and location in parallel and merge the results.
+    Every site works through its own combinations at its own concurrency limit.
+
+    Returns:
+        tuple: (DataFrame of all scraped jobs, per-site stats with scrapes, cached, failed, jobs and seconds)
+    """
+    futures = {}
+    for site in sites:
+        for search_term in search_terms:
+            for location in locations:
+                future = get_site_executor(site).submit(scrape_site, site, search_term, location, results_wanted, hours_old, country_indeed)
+                futures[future] = (site, search_term, location)
+
+    frames = []
+    windows = {}
+    stats = {site: {"scrapes": 0, "cached": 0, "failed": 0, "jobs": 0, "seconds": 0.0} for site in sites}
+    for future in as_completed(futures):
+        site, search_term, location = futures[future]
+        stats[site]["scrapes"] += 1
+        try:
+            jobs, source, started, finished = future.result()
+        except Exception as e:
+            print(f"Failed to scrape {site} for '{search_term}' in '{location}': {e}")
+            stats[site]["failed"] += 1
+            continue
+        if source != "miss":
+            stats[site]["cached"] += 1
+        stats[site]["jobs"] += len(jobs)
+        first, last = windows.get(site, (started, finished))
+        windows[site] = (min(first, started), max(last, finished))
+        if not jobs.empty:
+            frames.append(jobs)
+    for site, (first, last) in windows.items():
+        stats[site]["seconds"] = round(last - first, 3)
+
+    if futures and all(stats[site]["failed"] == stats[site]["scrapes"] for site in sites):
+        raise RuntimeError("Every job scrape failed")
+    if not frames:
+        return pd.DataFrame(), stats
+    return pd.concat(frames, ignore_index=True), stats
+
+def get_jobs(search_term: str = "software engineer", location: str = "", results_wanted: int = 10, hours_old: int = 24, country_indeed: str = "USA", search_terms: list[str] = None, locations: list[str] = None, sites: list[str] = None):
+    """
+    Scrape jobs for every combination of sites, search terms and locations, save them to postgres and return them.
+    search_terms and locations default to the single search_term and location; sites defaults to indeed.
+
+    Returns:
+        dict: {"jobs": [{"title", "company", "job_url"}], "sites": per-site scrape counts and timing,
+               "saved": counts from save_jobs_to_postgres}
+    """
+    search_terms = list(dict.fromkeys(term for term in (search_terms or [search_term]) if term)) or [search_term]
+    locations = list(dict.fromkeys(locations or [location]))
+    sites = list(dict.fromkeys(site.strip().lower() for site in (sites or ["indeed"])))
+    unsupported = [site for site in sites if site not in SUPPORTED_SITES]
+    if unsupported:
+        raise ValueError(f"Unsupported job sites {unsupported}, expected any of {list(SUPPORTED_SITES)}")
+
+    started = time.monotonic()
+    jobs, site_stats = scrape_all(sites, search_terms, locations, results_wanted, hours_old, country_indeed)
+    # One normalized frame feeds both the tool response and the database writer
+    job_df = normalize_jobs(jobs)
+    print(f"Scraped {len(job_df)} unique jobs from {len(sites)} sites in {time.monotonic() - started:.1f}s: {site_stats}")
+    print(f"Scrape cache: {scrape_cache.get_stats()}")
+    if job_df.empty:
+        return {"jobs": [], "sites": site_stats}
+
+    jobs_json = job_df[["title", "company", "job_url"]].to_dict("records")
+    counts = save_jobs_to_postgres(job_df)
+    print(f"Saved jobs to postgres: {counts['inserted']} inserted, {counts['changed']} changed, {counts['seen']} seen again, {counts['unchanged']} unchanged")
     
-    return jobs_json
+    return {"jobs": jobs_json, "sites": site_stats, "saved": counts}
+
+def normalize_jobs(jobs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce a scraped jobs DataFrame to JOB_COLUMNS with plain dtypes: text columns as str with missing values
+    as "", descriptions with collapsed whitespace and is_remote as bool. Rows without a job_url are dropped
+    and duplicate job_urls keep their first row.
+    """
+    job_df = jobs.reindex(columns=JOB_COLUMNS)
+    for column in ("title", "company", "job_url", "location", "description"):
+        job_df[column] = job_df[column].fillna("").astype(str)
+    job_df["description"] = job_df["description"].str.replace(r"\s+", " ", regex=True).str.strip()
+    # jobspy reports is_remote as bool or None; anything but a true value counts as not remote
+    job_df["is_remote"] = job_df["is_remote"].astype(str).str.lower().isin(["true", "1", "1.0"])
+    job_df = job_df[job_df["job_url"] != ""]
+    return job_df.drop_duplicates(subset="job_url", keep="first").reset_index(drop=True)
 
-def save_jobs_to_postgres(job_df):
+def save_jobs_to_postgres(job_df, page_size: int = JOB_UPSERT_PAGE_SIZE, last_seen_resolution: float = JOB_LAST_SEEN_RESOLUTION):
     """
-    Save an array of job JSON objects to the PostgreSQL jobs table.
+    Bulk upsert the scraped jobs DataFrame into the PostgreSQL jobs table.
+    Rows are sent as multi-row VALUES batches of up to page_size rows, so a typical scrape is a single round trip.
+    An existing job is only written when its content_hash differs, which also sets last_changed, or when its last_seen
+    is older than last_seen_resolution seconds. A changed description is rescored, and curated again, on the next scoring run.
 
     Args:
-        jobs_json (list): List of job dicts with keys: title, company, job_url, description, location, is_remote.
-        db_conn_params (dict, optional): Dictionary with connection params (dbname, user, password, host, port).
-                                         If None, uses default localhost connection.
+        job_df (DataFrame): Jobs normalized by normalize_jobs.
+        page_size (int): Maximum number of rows per INSERT statement.
+        last_seen_resolution (float): Minimum age in seconds before last_seen of an unchanged job is refreshed.
+
+    Returns:
+        dict: Counts of inserted, changed, seen (only last_seen refreshed) and unchanged rows.
     """
-    conn = None
+    rows = build_job_rows(job_df)
+    counts = {"inserted": 0, "changed": 0, "seen": 0, "unchanged": 0}
+    if not rows:
+        return counts
     try:
-        conn = psycopg2.connect(
-            dbname=os.environ.get("POSTGRES_DB", "resume_agent"),
-            user=os.environ.get("POSTGRES_USER", "vector_admin"),
-            password=os.environ.get("POSTGRES_PASSWORD", "Resume_Pass"), 
-            host="pgvector-db",
-            port=5432
-        )
-        cur = conn.cursor()
-        insert_query = """
-            INSERT INTO jobs (title, company, job_url, description, location, is_remote)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (job_url) DO UPDATE
-            SET title = EXCLUDED.title,
-                company = EXCLUDED.company,
-                description = EXCLUDED.description,
-                location = EXCLUDED.location,
-                is_remote = EXCLUDED.is_remote
-        """
-        for _, job in job_df.iterrows():
-            raw_description = job.get("description", "")
-            description = ' '.join(raw_description.split())
-            cur.execute(
-                insert_query,
-                (
-                    job.get("title", ""),
-                    job.get("company", ""),
-                    job.get("job_url", ""),
-                    description,
-                    job.get("location", ""),
-                    job.get("is_remote", "False") in ["True", "true", True, 1]
-                )
-            )
-        conn.commit()
-        cur.close()
+        with get_postgres_connection() as conn:
+            cur = conn.cursor()
+            # RETURNING reports inserts (xmax = 0 on fresh rows) and content changes (last_changed set in this statement)
+            upsert_query = f"""
+                INSERT INTO jobs (title, company, job_url, description, location, is_remote, content_hash)
+                VALUES %s
+                ON CONFLICT (job_url) DO UPDATE
+                SET title = EXCLUDED.title,
+                    company = EXCLUDED.company,
+                    description = EXCLUDED.description,
+                    location = EXCLUDED.location,
+                    is_remote = EXCLUDED.is_remote,
+                    content_hash = EXCLUDED.content_hash,
+                    last_seen = now(),
+                    last_changed = CASE
+                        WHEN (jobs.title, jobs.company, jobs.description, jobs.location, jobs.is_remote)
+                             IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.company, EXCLUDED.description, EXCLUDED.location, EXCLUDED.is_remote)
+                        THEN now() ELSE jobs.last_changed END
+                WHERE jobs.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                   OR jobs.last_seen IS NULL
+                   OR jobs.last_seen < now() - make_interval(secs => {float(last_seen_resolution)})
+                RETURNING (xmax = 0) AS inserted, (last_changed = now()) AS changed
+            """
+            results = execute_values(cur, upsert_query, rows, page_size=page_size, fetch=True)
+            conn.commit()
+            cur.close()
+        counts["inserted"] = sum(1 for inserted, _ in results if inserted)
+        counts["changed"] = sum(1 for inserted, changed in results if changed and not inserted)
+        counts["seen"] = len(results) - counts["inserted"] - counts["changed"]
+        counts["unchanged"] = len(rows) - len(results)
+        return counts
     except Exception as e:
         print(f"Error saving jobs to postgres: {e}")
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
+
+def build_job_rows(job_df):
+    """
+    Convert the normalized jobs DataFrame into upsert tuples in JOB_COLUMNS order followed by the content hash.
+    normalize_jobs has already dropped duplicate job_urls, which a single INSERT ... ON CONFLICT statement cannot touch twice.
+    """
+    return [row + (get_content_hash(row),) for row in job_df[JOB_COLUMNS].itertuples(index=False, name=None)]
+
+def get_content_hash(row: tuple) -> str:
+    """Fingerprint the stored content of a job row (every column except job_url)."""
+    title, company, _, description, location, is_remote = row
+    content = "\x1f".join([title, company, description, location, str(bool(is_remote))])
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
\ No newline at end of file
@@ -0,0 +1,86 @@
+from concurrent.futures import Future
+import os
+import threading
+import time
+
+# Longest time a scrape result is reused; requests for fresher jobs (small hours_old) use a shorter window
+SCRAPE_CACHE_TTL = float(os.environ.get("SCRAPE_CACHE_TTL", "900"))
+SCRAPE_CACHE_MAX_ENTRIES = int(os.environ.get("SCRAPE_CACHE_MAX_ENTRIES", "256"))
+STAT_KEYS = {"hit": "hits", "miss": "misses", "coalesced": "coalesced"}
+
+
+def scrape_cache_ttl(hours_old: int = None, ttl: float = SCRAPE_CACHE_TTL) -> float:
+    """Return how long a scrape for postings up to hours_old hours old may be reused."""
+    if hours_old:
+        return min(ttl, hours_old * 3600)
+    return ttl
+
+
+class ScrapeCache:
+    """
+    In-process TTL cache of scrape results.
+    Concurrent requests for the same key share one in-flight scrape; failed scrapes are not cached.
+    """
+    def __init__(self, max_entries: int = SCRAPE_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        # key -> [expires_at or None while in flight, future]
+        self._entries = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def get_or_scrape(self, key, ttl: float, scrape):
+        """
+        Return the cached result for key, wait for an identical scrape in flight, or call scrape().
+
+        Returns:
+            tuple: (result, source) where source is "hit", "coalesced" or "miss".
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is None:
+                source = "coalesced"
+            elif entry is not None and entry[0] > now:
+                source = "hit"
+            else:
+                source = "miss"
+                entry = [None, Future()]
+                self._entries[key] = entry
+                self._evict(now)
+            self._stats[STAT_KEYS[source]] += 1
+
+        future = entry[1]
+        if source == "miss":
+            try:
+                future.set_result(scrape())
+                with self._lock:
+                    entry[0] = time.monotonic() + ttl
+            except Exception as e:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                future.set_exception(e)
+        return future.result(), source
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the oldest finished ones while over max_entries. Caller holds the lock."""
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at is not None and expires_at <= now]:
+            del self._entries[key]
+        finished = sorted(
+            (key for key, (expires_at, _) in self._entries.items() if expires_at is not None),
+            key=lambda key: self._entries[key][0]
+        )
+        while len(self._entries) > self.max_entries and finished:
+            del self._entries[finished.pop(0)]
+
+    def get_stats(self) -> dict:
+        """Return hit/miss counters for the scrape cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
+
+
+scrape_cache = ScrapeCache()